@@ -1,8 +1,15 @@
 import os
+import time
 import argbind
+from typing import Optional
 import logging
 from wildcat_connection import WildcatConnectionCSV
 from . import IRVElection
+from .ballots import RankedChoiceBallots
+from .results import ResultsWriter
+from .tabulation import election_record
+from .instrumentation import TimingCollector, StageEvent, profiling, top_functions
+from .watch import FolderWatcher
 
 """
 WTF is going on here?
@@ -34,7 +41,18 @@ def run(
     wc_file: str,
     ballots_output: bool = False,
     elections_output: str = "./elections",
-    verbose: bool = False
+    verbose: bool = False,
+    duplicate_policy: str = "error",
+    spoil_policy: str = "discard",
+    workers: int = 0,
+    transfers_output: bool = False,
+    results_file: str = "",
+    text_results: bool = False,
+    watch: bool = False,
+    watch_interval: float = 2.0,
+    profile: bool = False,
+    profile_output: str = "",
+    trace_memory: bool = False
 ) -> list[tuple[str, str, list[dict]]]:
     """
     End-to-end IRV calculation from Wildcat Connection CSV.
@@ -44,13 +62,49 @@ def run(
     Parameters
     ----------
     wc_file : str
-        CSV file generated from exported election on Wildcat Connection
+        CSV file generated from exported election on Wildcat Connection.
+        To merge several exports into one tabulation, give a directory of exports,
+        or several files separated by ':' (';' on Windows).
     ballots_output : bool, optional
         Whether to save preprocessed ballot. Default: False
     elections_output : str, optional
         Folder for saving elections output. Default: "./elections"
     verbose : bool, optional
         Whether to print extra information. Default: False
+    duplicate_policy : str, optional
+        When merging exports, what to do with submissions sharing a SubmissionId:
+        "error", "first", "last" or "drop". Default: "error"
+    spoil_policy : str, optional
+        What to do with ballots that skip a rank or rank a candidate twice: "discard" them,
+        "skip_gaps" to ignore the empty ranks and repeats, or "truncate" them at the first problem.
+        Default: "discard"
+    workers : int, optional
+        Number of threads parsing exports concurrently. 0 picks one per export, up to the CPU count. Default: 0
+    transfers_output : bool, optional
+        Whether to also save each round's vote transfers and each ballot's final destination
+        in `elections_output`. Default: False
+    results_file : str, optional
+        Save every question's winner and round tallies to this one JSON Lines (`.jsonl`), CSV (`.csv`)
+        or Parquet (`.parquet`, needs pyarrow) file instead of a text file per question in `elections_output`.
+        See `irv.results`. Default: ""
+    text_results : bool, optional
+        With `results_file`, also write the text file per question. Default: False.
+        `verbose` prints every question's text report either way.
+    watch : bool, optional
+        Treat `wc_file` as a folder and keep watching it: every time an export in it is added or changed,
+        tabulate that export and write its results to `elections_output/<export name>/`. Stop with Ctrl-C.
+        `duplicate_policy`, `spoil_policy`, `transfers_output` and the `IRVElection` flags apply to every export,
+        and changing any of them re-tabulates every export. `ballots_output`, `results_file`, `text_results`
+        and the profiling flags can't be combined with it. Default: False
+    watch_interval : float, optional
+        Seconds between checks of the watched folder. Exports must also stay unchanged this long
+        before they are read, so partially copied files are skipped. Default: 2.0
+    profile : bool, optional
+        Whether to print a timing summary of parsing, counting, tie breaking and writing. Default: False
+    profile_output : str, optional
+        If given, profiles the run with cProfile and saves the stats to this file. Default: ""
+    trace_memory : bool, optional
+        Whether to trace peak memory with tracemalloc (slow). Reported with `profile`. Default: False
 
     Returns
     -------
@@ -59,29 +113,133 @@ def run(
         in that order.
 
     """
-    ballot = WildcatConnectionCSV(wc_file)
+    if watch:
+        _check_watch_flags(ballots_output=ballots_output, results_file=results_file, text_results=text_results,
+                           profile=profile, profile_output=profile_output, trace_memory=trace_memory)
+        watcher = FolderWatcher(wc_file, elections_output or "./elections", interval=watch_interval,
+                                debounce=watch_interval, duplicate_policy=duplicate_policy, spoil_policy=spoil_policy,
+                                transfers_output=transfers_output, **_election_options())
+        return _watch(watcher, verbose)
+
+    collector = TimingCollector() if profile or profile_output or trace_memory else None
+    with profiling(collector, profile_output, trace_memory):
+        ballot = WildcatConnectionCSV(wc_file, observer=collector, duplicate_policy=duplicate_policy,
+                                      max_workers=workers or None, spoil_policy=spoil_policy)
+        if results_file:
+            with ResultsWriter(results_file) as writer:
+                results = _run_elections(ballot, ballots_output, elections_output, verbose, transfers_output,
+                                         collector, writer, text_results)
+        else:
+            results = _run_elections(ballot, ballots_output, elections_output, verbose, transfers_output, collector)
+
+    if collector is not None:
+        print(collector.summary())
+        if profile_output:
+            print(f"cProfile stats saved in {profile_output}")
+            if verbose:
+                print(top_functions(profile_output))
+    return results
+
+
+def _election_options() -> dict:
+    """
+    Helper for `run`. The `IRVElection` options that change results, as set on the command line.
+
+    argbind only fills them in when an `IRVElection` is created, so one is created without ballots to read them.
+    """
+    election = IRVElection(RankedChoiceBallots([]), save_log=False, log_to_stderr=False)
+    return {name: getattr(election, name) for name in ("remove_exhausted_ballots", "analyze_ties", "tie_branch_budget")}
+
+
+def _check_watch_flags(**flags) -> None:
+    """Helper for `run`. Raises ValueError if any flag that `--watch` doesn't support is set."""
+    unsupported = [f"--{name}" for name, value in flags.items() if value]
+    if unsupported:
+        raise ValueError(f"{', '.join(unsupported)} can't be combined with --watch")
+
+
+def _watch(watcher: FolderWatcher, verbose: bool) -> list[tuple[str, str, list[dict]]]:
+    """Helper for `run`. Tabulates exports in the watched folder as they change, until interrupted."""
+    results = []
+
+    def on_result(filepath: str, question: str, winner: str, steps: list[dict]) -> None:
+        results.append((question, winner, steps))
+        if verbose:
+            print(f"{os.path.basename(filepath)} | {question}: {winner}")
+
+    watcher.on_result = on_result
+    if verbose:
+        print(f"Watching {watcher.folder} for exports. Results saved in {watcher.elections_output}. "
+              "Press Ctrl-C to stop.")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    return results
+
+
+def _run_elections(
+    ballot: WildcatConnectionCSV,
+    ballots_output: bool,
+    elections_output: str,
+    verbose: bool,
+    transfers_output: bool = False,
+    collector: TimingCollector = None,
+    writer: ResultsWriter = None,
+    text_results: bool = True
+) -> list[tuple[str, str, list[dict]]]:
+    """
+    Helper for `run`, see `run` for parameters.
+
+    With `verbose`, every question's text report is printed, whether results are saved to text files,
+    to `writer`, or both.
+    """
     if ballots_output:
         if verbose:
             print(f"Saving ballots. Ballot folder: {ballot.get_ballot_folder()}")
         ballot.save_to_files(include_spoilt_ballots=True)
 
-    if elections_output and verbose:
+    if elections_output and text_results and verbose:
         print(f"Election results saved in {elections_output}")
+    if writer is not None and verbose:
+        print(f"Election results saved in {writer.filepath}")
 
     results = []
     for name, ballots in ballot.question_formatted_ballots.items():
-        election = IRVElection(ballots, name)
+        election = IRVElection(ballots, name=name, observer=collector, record_transfers=transfers_output)
         winner, steps = election.run()
         if verbose:
             print(question_title_format(name))
             print(election.results_string(winner, steps))
         results.append((name, winner, steps))
+        start = time.perf_counter()
+        if writer is not None:
+            writer.write(election_record(name, winner, steps, len(ballots), ballot.question_spoilt_ballots.get(name)))
         if elections_output:
-            os.makedirs(elections_output, exist_ok=True)
-            election.write_results(winner, steps, os.path.join(elections_output, f"{name}.txt"))
+            _write_election_files(election, winner, steps, elections_output, text_results, transfers_output)
+        _emit_write(collector, start, name, len(ballots), writer is not None or bool(elections_output))
     return results
 
 
+def _write_election_files(election: IRVElection, winner: str, steps: list[dict], elections_output: str,
+                          text_results: bool, transfers_output: bool) -> None:
+    """Helper for `_run_elections`. Writes the text report and transfers of one question, as requested."""
+    if not (text_results or transfers_output):
+        return
+    os.makedirs(elections_output, exist_ok=True)
+    if text_results:
+        election.write_results(winner, steps, os.path.join(elections_output, f"{election.name}.txt"))
+    if transfers_output:
+        election.write_transfers(os.path.join(elections_output, f"{election.name}_transfers.csv"),
+                                 os.path.join(elections_output, f"{election.name}_fates.txt"))
+
+
+def _emit_write(collector: Optional[TimingCollector], start: float, name: str, num_ballots: int, wrote: bool) -> None:
+    """Helper for `_run_elections`. Records the "write" stage of one question, if anything was written."""
+    if collector is not None and wrote:
+        collector.on_stage(StageEvent("write", time.perf_counter() - start, name, num_ballots))
+
+
 def main_func():
     args = argbind.parse_args()
     with argbind.scope(args):
@@ -0,0 +1,280 @@
+"""
+Ballot-polling risk-limiting audits of IRV outcomes.
+
+The reported elimination order is broken down into assertions, each a comparison of two tallies that can
+be checked from a random sample of paper ballots, in the style of RAIRE. Each assertion is tested with
+BRAVO's sequential probability ratio test, and the audit confirms the outcome once every assertion has.
+
+    audit = BallotPollingAudit(election, winner, steps, risk_limit=0.05)
+    audit.draw_sample(200, seed=2024)            # SubmissionIDs of the ballots to pull
+    audit.measure_risk(interpreted_votes)        # after reading the pulled ballots
+    audit.completion_probability([100, 200, 400], seeds=range(1000))  # workload planning
+
+Planning simulates audits of the reported ballots, re-tallying each sample with the encoded-ballot engine.
+"""
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+
+from .constants import NO_CONFIDENCE, UNBREAKABLE_TIE_WINNER
+from .engine import EXHAUSTED, EncodedBallots
+from .irv import IRVElection
+
+MAX_SIMULATION_CELLS = 2**23
+"""Upper bound on assertions x seeds x sample size values simulated at once, to bound memory"""
+
+
+class Assertion(NamedTuple):
+    """
+    `winner` has more votes than `loser` when only the `active` candidates remain.
+
+    A `loser` of "No Confidence" means `winner` has more than half of all ballots cast.
+    """
+    winner: str
+    loser: str
+    active: frozenset
+
+    def __str__(self) -> str:
+        against = "half of all ballots" if self.loser == NO_CONFIDENCE else self.loser
+        return f"{self.winner} beats {against} among {{{', '.join(sorted(self.active))}}}"
+
+
+def irv_assertions(winner: str, steps: list[dict], num_ballots: int) -> list[Assertion]:
+    """
+    Assertions that together confirm the reported elimination order, and so the winner.
+
+    Every candidate eliminated in a round must trail each candidate that survives it, and the winner must
+    either have a majority of all ballots or, with exhausted ballots removed, beat every finalist.
+
+    Parameters
+    ----------
+    winner : str
+        Winner, as returned by `IRVElection.run`
+    steps : list[dict]
+        Round tallies, as returned by `IRVElection.run`
+    num_ballots : int
+        Number of ballots cast
+
+    Returns
+    -------
+    assertions : list[Assertion]
+
+    Raises
+    ------
+    ValueError
+        If there is no winner to confirm
+    """
+    if winner in (NO_CONFIDENCE, UNBREAKABLE_TIE_WINNER) or not steps:
+        raise ValueError(f"There is no winner to audit, the result was {winner}")
+
+    assertions = []
+    for step, next_step in zip(steps, steps[1:]):
+        active = frozenset(step)
+        for loser in set(step) - set(next_step):
+            assertions += [Assertion(survivor, loser, active) for survivor in sorted(next_step)]
+
+    final = frozenset(steps[-1])
+    if steps[-1][winner] > num_ballots / 2:
+        assertions.append(Assertion(winner, NO_CONFIDENCE, final))
+    else:
+        assertions += [Assertion(winner, finalist, final) for finalist in sorted(final - {winner})]
+    return assertions
+
+
+class BallotPollingAudit:
+    """
+    BRAVO ballot-polling audit of an IRV outcome, see the module docstring.
+
+    Parameters
+    ----------
+    election : IRVElection
+        Election that was run
+    winner : str
+        Winner, as returned by `election.run`
+    steps : list[dict]
+        Round tallies, as returned by `election.run`
+    risk_limit : float, optional
+        Largest acceptable chance of confirming a wrong outcome. Default: 0.05
+
+    Attributes
+    ----------
+    assertions : list[Assertion]
+        See `irv_assertions`
+    shares : np.ndarray[float]
+        Reported share of each assertion's winner among ballots counting for its winner or loser.
+        For majority assertions, the share of all ballots.
+    margins : np.ndarray[int]
+        Reported votes by which each assertion holds
+    """
+    def __init__(self, election: IRVElection, winner: str, steps: list[dict], risk_limit: float = 0.05):
+        self.encoded: EncodedBallots = election.ballots.encoded
+        self.num_ballots: int = len(election.ballots)
+        self.risk_limit: float = risk_limit
+        self.assertions: list[Assertion] = irv_assertions(winner, steps, self.num_ballots)
+        # original ballots that were counted, and their rows in `encoded`
+        self._counted: np.ndarray = np.flatnonzero(self.encoded.weights[self.encoded.inverse] > 0)
+        self._population: np.ndarray = self.encoded.inverse[self._counted]
+
+        winners, losers, self.shares, self.margins = self._reported_tallies()
+        # destination of every unique ballot in each assertion's round
+        destinations = np.stack([self._destinations(assertion.active) for assertion in self.assertions])
+        self._log_increments: np.ndarray = self._bravo_increments(destinations, winners, losers, self.shares)
+
+    def _destinations(self, active: frozenset) -> np.ndarray:
+        """Helper for `__init__`. Destination of every unique ballot with `active` standing."""
+        mask = self.encoded.active_mask(active)
+        destinations, _ = self.encoded.count(mask)
+        # stores with a memory budget don't keep destinations
+        return self.encoded.destinations(mask) if destinations is None else destinations
+
+    def _reported_tallies(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Helper for `__init__`. Codes of winners and losers (`EXHAUSTED` for "No Confidence"), shares and margins."""
+        index = self.encoded.index
+        winners = np.array([index[assertion.winner] for assertion in self.assertions])
+        losers = np.array([index.get(assertion.loser, EXHAUSTED) for assertion in self.assertions])
+        shares, margins = np.empty(len(self.assertions)), np.empty(len(self.assertions), dtype=np.int64)
+        for i, assertion in enumerate(self.assertions):
+            _, tally = self.encoded.count(self.encoded.active_mask(assertion.active))
+            if losers[i] == EXHAUSTED:
+                shares[i] = tally[winners[i]] / self.num_ballots
+                margins[i] = 2 * tally[winners[i]] - self.num_ballots
+            else:
+                both = tally[winners[i]] + tally[losers[i]]
+                shares[i] = tally[winners[i]] / both if both else 0.5
+                margins[i] = tally[winners[i]] - tally[losers[i]]
+        return winners, losers, shares, margins
+
+    @staticmethod
+    def _bravo_increments(destinations: np.ndarray, winners: np.ndarray, losers: np.ndarray,
+                          shares: np.ndarray) -> np.ndarray:
+        """
+        Helper for `__init__`. Log BRAVO likelihood ratio contributed by each unique ballot to each assertion.
+
+        A ballot for the assertion's winner multiplies the test statistic by `share / 0.5`, and one for its loser
+        by `(1 - share) / 0.5`. For majority assertions every ballot not for the winner counts against it.
+        """
+        with np.errstate(divide="ignore"):
+            for_winner = np.log(2 * shares)[:, None]
+            for_loser = np.log(2 * (1 - shares))[:, None]
+        against = np.where(losers[:, None] == EXHAUSTED, destinations != winners[:, None],
+                           destinations == losers[:, None])
+        return np.where(destinations == winners[:, None], for_winner, np.where(against, for_loser, 0.0))
+
+    @property
+    def diluted_margin(self) -> float:
+        """Smallest assertion margin as a fraction of ballots cast, which drives the audit's workload"""
+        return float(self.margins.min()) / self.num_ballots
+
+    def _sample_rows(self, size: int, seed: int) -> np.ndarray:
+        """Rows of `encoded` of a sample of `size` counted ballots, drawn with replacement"""
+        rng = np.random.default_rng(seed)
+        return self._population[rng.integers(len(self._population), size=size)]
+
+    def draw_sample(self, size: int, seed: int) -> np.ndarray:
+        """
+        Draws the ballots to pull for the audit, with replacement as BRAVO requires.
+
+        Parameters
+        ----------
+        size : int
+            Number of ballots to draw
+        seed : int
+            Publicly chosen seed, so observers can check the sample
+
+        Returns
+        -------
+        sample : np.ndarray[int]
+            SubmissionIDs of the sampled ballots, or ballot indices if the ballots have no IDs
+        """
+        rng = np.random.default_rng(seed)
+        ballots = self._counted[rng.integers(len(self._counted), size=size)]
+        if self.encoded.ids is None:
+            return ballots
+        return self.encoded.ids[self.encoded.inverse[ballots]]
+
+    def measure_risk(self, votes: list[list[str]]) -> dict[Assertion, float]:
+        """
+        Measures the risk of each assertion from the interpretations of the sampled paper ballots.
+
+        Parameters
+        ----------
+        votes : list[list[str]]
+            Rankings read from the sampled ballots, in sample order
+
+        Returns
+        -------
+        risks : dict[Assertion, float]
+            BRAVO p-value of each assertion. The outcome is confirmed once every risk is at most `risk_limit`.
+        """
+        sample = EncodedBallots.from_votes(votes)
+        risks = {}
+        for i, assertion in enumerate(self.assertions):
+            active = np.zeros(len(sample.candidates), dtype=bool)
+            active[[code for name, code in sample.index.items() if name in assertion.active]] = True
+            destinations = sample.destinations(active)
+            winners = np.array([sample.index.get(assertion.winner, -2)])
+            losers = np.array([sample.index.get(assertion.loser, EXHAUSTED if assertion.loser == NO_CONFIDENCE
+                                                else -2)])
+            increments = self._bravo_increments(destinations[None, :], winners, losers, self.shares[i:i + 1])[0]
+            statistic = np.cumsum(increments[sample.inverse]).max(initial=0.0)
+            risks[assertion] = float(min(1.0, np.exp(-statistic)))
+        return risks
+
+    def sample_sizes_needed(self, seeds: Iterable[int], max_sample_size: int) -> np.ndarray:
+        """
+        Simulates the audit on the reported ballots, once per seed.
+
+        Parameters
+        ----------
+        seeds : Iterable[int]
+            Seeds of the simulated samples; the sample of each seed is the same as `draw_sample` draws
+        max_sample_size : int
+            Largest sample simulated
+
+        Returns
+        -------
+        sample_sizes : np.ndarray[int]
+            Number of ballots after which every assertion was confirmed, or -1 if not by `max_sample_size`
+        """
+        seeds = list(seeds)
+        threshold = np.log(1 / self.risk_limit)
+        chunk = max(1, MAX_SIMULATION_CELLS // max(1, len(self.assertions) * max_sample_size))
+        needed = np.empty(len(seeds), dtype=np.int64)
+        for start in range(0, len(seeds), chunk):
+            rows = np.stack([self._sample_rows(max_sample_size, seed) for seed in seeds[start:start + chunk]])
+            statistics = np.cumsum(self._log_increments[:, rows], axis=-1)
+            confirmed = statistics >= threshold
+            # BRAVO stops each assertion the first time its statistic crosses the threshold
+            first = np.where(confirmed.any(axis=-1), confirmed.argmax(axis=-1) + 1, -1)
+            needed[start:start + chunk] = np.where((first == -1).any(axis=0), -1, first.max(axis=0))
+        return needed
+
+    def completion_probability(self, sample_sizes: Iterable[int], seeds: Iterable[int]) -> np.ndarray:
+        """
+        Estimates the chance that the audit finishes within each sample size, for planning workload.
+
+        Parameters
+        ----------
+        sample_sizes : Iterable[int]
+            Sample sizes to evaluate
+        seeds : Iterable[int]
+            Seeds of the simulated audits, see `sample_sizes_needed`
+
+        Returns
+        -------
+        probabilities : np.ndarray[float]
+            Fraction of simulated audits that finished within each sample size
+        """
+        sample_sizes = np.asarray(list(sample_sizes))
+        needed = self.sample_sizes_needed(seeds, int(sample_sizes.max(initial=0)))
+        finished = np.sort(needed[needed != -1])
+        return np.searchsorted(finished, sample_sizes, side="right") / max(len(needed), 1)
+
+    def expected_sample_size(self, seeds: Iterable[int], max_sample_size: int,
+                             quantile: Optional[float] = None) -> float:
+        """
+        Mean (or `quantile`) of the simulated sample sizes, counting unfinished audits as `max_sample_size`.
+        """
+        needed = self.sample_sizes_needed(seeds, max_sample_size)
+        needed = np.where(needed == -1, max_sample_size, needed)
+        return float(needed.mean() if quantile is None else np.quantile(needed, quantile))
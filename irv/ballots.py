@@ -1,3 +1,38 @@
+from typing import Optional
+from .engine import EncodedBallots
+
+_MUTATORS = ("__setitem__", "__delitem__", "__iadd__", "__imul__", "append", "extend", "insert", "pop", "remove",
+             "clear", "sort", "reverse")
+
+
+class _ObservedList(list):
+    """List that tells its `RankedChoiceBallots` owner whenever it is changed in place"""
+    __slots__ = ("_owner",)
+
+    def __init__(self, items, owner: "RankedChoiceBallots"):
+        super().__init__(items)
+        self._owner = owner
+
+    def __reduce__(self):
+        # copies and pickles are plain lists, `RankedChoiceBallots.__setstate__` watches them again
+        return list, (list(self),)
+
+
+def _notifying(name: str):
+    method = getattr(list, name)
+
+    def mutate(self, *args):
+        result = method(self, *args)
+        self._owner._votes_changed()
+        return result
+    mutate.__name__ = name
+    return mutate
+
+
+for _name in _MUTATORS:
+    setattr(_ObservedList, _name, _notifying(_name))
+
+
 class RankedChoiceBallots:
     """
     RankedChoiceBallots is a representation of a single elections ballots.
@@ -6,10 +41,50 @@ class RankedChoiceBallots:
     ----------
     votes : list[list[str]]
         2D list of votes. `votes[i][j]` is the candidate name that the `i`th voter ranked as `(j+1)`th.
+    encoded : EncodedBallots
+        Int-coded, deduplicated view of `votes` used for counting. Built on first use,
+        and rebuilt after `votes` or any ballot in it is changed in place.
+
+    Parameters
+    ----------
+    votes : list[list[str]], optional
+        See `votes`. Copied, so edit the ballots through `votes` rather than the list passed in.
+    encoded : EncodedBallots, optional
+        Already encoded ballots, e.g. a view into `WildcatConnectionCSV.ballot_tensor`.
+        `votes` is then decoded from it on first use. Exactly one of `votes` and `encoded` must be given.
     """
-    def __init__(self, votes):
-        self.votes: list[list[str]] = votes
+    __slots__ = ("_votes", "_encoded")
+
+    def __init__(self, votes: Optional[list[list[str]]] = None, encoded: Optional[EncodedBallots] = None):
+        if (votes is None) == (encoded is None):
+            raise ValueError("Exactly one of votes and encoded must be given!")
+        self._votes: Optional[list[list[str]]] = None
+        self._encoded: Optional[EncodedBallots] = encoded
+
+        if encoded is not None:
+            encoded.validate()
+        else:
+            self._validate_votes(votes)
+            self._votes = self._observe(votes)
+
+    def _observe(self, votes: list[list[str]]) -> list[list[str]]:
+        """Wraps `votes` and every ballot in it, so changing them in place drops `encoded`"""
+        ballots = (ballot if isinstance(ballot, _ObservedList) and ballot._owner is self
+                   else _ObservedList(ballot, self) for ballot in votes)
+        return _ObservedList(ballots, self)
+
+    def _votes_changed(self) -> None:
+        """Called by `votes` when it, or a ballot in it, is changed in place"""
+        self._encoded = None
+
+    def __setstate__(self, state: tuple) -> None:
+        for name, value in state[1].items():
+            setattr(self, name, value)
+        if self._votes is not None:
+            self._votes = self._observe(self._votes)
 
+    @staticmethod
+    def _validate_votes(votes: list[list[str]]) -> None:
         for single_ballot in votes:
             for candidate in single_ballot:
                 if single_ballot.count(candidate) > 1:
@@ -19,20 +94,48 @@ class RankedChoiceBallots:
             if not typecheck:
                 raise ValueError("Not every value is a string!")
 
+    @property
+    def votes(self) -> list[list[str]]:
+        """2D list of votes, decoded from `encoded` on first use if needed"""
+        if self._votes is None:
+            self._votes = self._observe(self._encoded.decode())
+        return self._votes
+
+    @votes.setter
+    def votes(self, votes: list[list[str]]) -> None:
+        """Replaces the ballots. `encoded`, and with it every cached count, is rebuilt on next use."""
+        self._validate_votes(votes)
+        self._votes = self._observe(votes)
+        self._encoded = None
+
+    def drop_votes(self) -> None:
+        """
+        Frees the string view `votes` once `encoded` exists, e.g. before counting a large election.
+        `votes` is decoded again if it is used later.
+        """
+        self.encoded  # builds it if needed
+        self._votes = None
+
+    def __len__(self) -> int:
+        """Number of ballots cast, without decoding `votes`"""
+        if self._encoded is not None:
+            return self._encoded.num_ballots
+        return len(self._votes)
+
+    @property
+    def encoded(self) -> EncodedBallots:
+        """Int-coded, deduplicated view of `votes`"""
+        if self._encoded is None:
+            # ballots appended since the last encoding aren't watched yet
+            self._votes = self._observe(self._votes)
+            self._encoded = EncodedBallots.from_votes(self._votes)
+            self._encoded.validate()
+        return self._encoded
+
     def get_candidates(self) -> set[str]:
         """Gets all unique candidate names"""
-        candidates = set()
-        for single_ballot in self.votes:
-            for candidate in single_ballot:
-                candidates.add(candidate)
-        return candidates
+        return set(self.encoded.candidates)
 
     def get_appearances_in_rank(self, candidate: str, rank: int):
         """Gets the number times `candidate` was ranked `rank` before eliminations"""
-        rank_tally = 0
-        for single_ballot in self.votes:
-            if len(single_ballot) < rank:
-                continue
-            elif single_ballot[rank-1] == candidate:
-                rank_tally += 1
-        return rank_tally
+        return self.encoded.appearances_in_rank(candidate, rank)
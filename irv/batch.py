@@ -0,0 +1,153 @@
+"""
+Asyncio batch API for tabulating many organizations' elections in one go.
+
+    async for result in tabulate_batch({"Slivka": "slivka.csv", "Willard": "willard_exports/"}):
+        print(result.org, result.question, result.winner)
+
+Files are read on threads so the event loop never blocks, parsing and counting run on an executor,
+and results stream out as soon as each question finishes.
+"""
+import asyncio
+from concurrent.futures import Executor
+from typing import AsyncIterator, Iterable, Mapping, NamedTuple, Optional, Union
+
+from wildcat_connection.utils import expand_export_paths
+from .tabulation import parse_export, tabulate_question
+
+Sources = Union[Mapping[str, Union[str, list[str]]], Iterable[tuple[str, Union[str, list[str]]]]]
+
+
+class BatchResult(NamedTuple):
+    """
+    Outcome of one question of one organization's election.
+
+    If the organization's export could not be tabulated, a single result with `question` and `winner`
+    set to None and `error` describing the failure is produced instead.
+    """
+    org: str
+    question: Optional[str]
+    winner: Optional[str]
+    steps: list[dict]
+    error: Optional[str] = None
+    num_ballots: int = 0
+
+    def record(self) -> dict:
+        """`election_record` of this result with an "org" key, e.g. for `irv.results.ResultsWriter`"""
+        return {"org": self.org, "question": self.question, "winner": self.winner,
+                "num_ballots": self.num_ballots, "steps": self.steps}
+
+
+def _read_files(filepaths: list[str]) -> list[bytes]:
+    contents = []
+    for filepath in filepaths:
+        with open(filepath, "rb") as file:
+            contents.append(file.read())
+    return contents
+
+
+async def _tabulate_org(org: str,
+                        source: Union[str, list[str]],
+                        queue: asyncio.Queue,
+                        semaphore: asyncio.Semaphore,
+                        executor: Optional[Executor],
+                        remove_exhausted_ballots: bool,
+                        duplicate_policy: str,
+                        timeout: Optional[float]) -> None:
+    """Reads, parses and tabulates one organization's export(s), putting each result on `queue`"""
+    loop = asyncio.get_running_loop()
+    async with semaphore:
+        try:
+            data = await asyncio.to_thread(_read_files, expand_export_paths(source))
+            parse = loop.run_in_executor(executor, parse_export, data, duplicate_policy)
+            question_ballots, _ = await asyncio.wait_for(parse, timeout)
+            tabulations = [
+                loop.run_in_executor(executor, tabulate_question, question, ballots, remove_exhausted_ballots)
+                for question, ballots in question_ballots.items()
+            ]
+            for tabulation in asyncio.as_completed(tabulations, timeout=timeout):
+                record = await tabulation
+                # blocks while the consumer is behind, which holds the semaphore and so pauses new parsing
+                await queue.put(BatchResult(org, record["question"], record["winner"], record["steps"],
+                                            num_ballots=record["num_ballots"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = "timed out" if isinstance(e, asyncio.TimeoutError) else f"{type(e).__name__}: {e}"
+            await queue.put(BatchResult(org, None, None, [], error))
+
+
+async def tabulate_batch(sources: Sources,
+                         max_concurrency: int = 4,
+                         executor: Optional[Executor] = None,
+                         remove_exhausted_ballots: bool = False,
+                         duplicate_policy: str = "error",
+                         timeout: Optional[float] = None,
+                         queue_size: int = 64) -> AsyncIterator[BatchResult]:
+    """
+    Tabulates every organization's election, yielding results as they finish.
+
+    Closing the generator (`aclose`, or leaving a `contextlib.aclosing` block), or cancelling the task
+    iterating it, cancels every outstanding organization.
+    Work already running on `executor` finishes, but its results are discarded.
+
+    Parameters
+    ----------
+    sources : Mapping[str, str or list[str]] or Iterable[tuple[str, str or list[str]]]
+        Maps organization name to its Wildcat Connection export(s), in any form accepted by `WildcatConnectionCSV`
+    max_concurrency : int, optional
+        Maximum number of organizations read, parsed and tabulated at once. Default: 4
+    executor : Executor, optional
+        Executor for parsing and counting, e.g. a `ProcessPoolExecutor`.
+        Default: the event loop's default thread pool
+    remove_exhausted_ballots : bool, optional
+        See `IRVElection`. Default: False
+    duplicate_policy : str, optional
+        See `WildcatConnectionCSV`. Default: "error"
+    timeout : float, optional
+        Seconds allowed for parsing, and again for tabulating, each organization's export, so one huge
+        export can't hold a concurrency slot forever. Default: no limit
+    queue_size : int, optional
+        Number of finished results buffered before workers wait for the consumer. Default: 64
+
+    Yields
+    ------
+    result : BatchResult
+        One result per question, or one error result per failed organization
+    """
+    items = list(sources.items()) if isinstance(sources, Mapping) else list(sources)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = [
+        asyncio.create_task(_tabulate_org(org, source, queue, semaphore, executor, remove_exhausted_ballots,
+                                          duplicate_policy, timeout))
+        for org, source in items
+    ]
+    pending = set(tasks)
+    getter = None
+    try:
+        while pending or not queue.empty():
+            if not queue.empty():
+                yield queue.get_nowait()
+                continue
+            getter = asyncio.ensure_future(queue.get())
+            finished, _ = await asyncio.wait(pending | {getter}, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished - {getter}:
+                pending.discard(task)
+                task.result()  # re-raise unexpected errors
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+    finally:
+        if getter is not None:
+            getter.cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def run_batch(sources: Sources, **kwargs) -> list[BatchResult]:
+    """Synchronous wrapper around `tabulate_batch`, returning every result. Takes the same arguments."""
+    async def collect() -> list[BatchResult]:
+        return [result async for result in tabulate_batch(sources, **kwargs)]
+    return asyncio.run(collect())
@@ -0,0 +1,302 @@
+"""
+Performance regression gate for `IRVElection.run` and `WildcatConnectionCSV` ingestion.
+
+Runs a fixed set of scenarios on synthetic datasets, and either saves the measurements as a
+machine-tagged baseline, or compares them against the saved baseline and exits non-zero on regressions.
+
+    $ python -m irv.benchmark --save        # record a baseline for this machine
+    $ python -m irv.benchmark               # compare against it
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from wildcat_connection import WildcatConnectionCSV
+from . import BENCHMARK_FOLDER
+from .irv import IRVElection
+from .synthetic import generate_ballots, write_wc_csv
+
+
+class Scenario:
+    """
+    A single benchmark scenario.
+
+    Parameters
+    ----------
+    name : str
+        Unique name, used as key in the baseline file
+    setup : Callable[[str], Callable[[], object]]
+        Called once with a scratch folder, returns the function to time.
+        Dataset generation happens here so it is not measured.
+    """
+    def __init__(self, name: str, setup: Callable[[str], Callable[[], object]]):
+        self.name = name
+        self.setup = setup
+
+
+def _irv_run_scenario(num_ballots: int, num_candidates: int, cached: bool = False) -> \
+        Callable[[str], Callable[[], object]]:
+    def setup(folder: str) -> Callable[[], object]:
+        ballots = generate_ballots(num_ballots, num_candidates, seed=num_ballots)
+
+        def run() -> object:
+            # unless measuring repeated runs, count from scratch every time
+            if not cached:
+                ballots.encoded.cache.clear()
+            return IRVElection(ballots).run()
+        return run
+    return setup
+
+
+def _wc_ingest_scenario(num_submissions: int, question_num_candidates: dict[str, int]) -> \
+        Callable[[str], Callable[[], object]]:
+    def setup(folder: str) -> Callable[[], object]:
+        filepath = os.path.join(folder, f"wc_{num_submissions}.csv")
+        write_wc_csv(filepath, num_submissions, question_num_candidates, seed=num_submissions)
+        return lambda: WildcatConnectionCSV(filepath)
+    return setup
+
+
+SCENARIOS = [
+    Scenario("irv_run_1k_8", _irv_run_scenario(1_000, 8)),
+    Scenario("irv_run_50k_12", _irv_run_scenario(50_000, 12)),
+    Scenario("irv_rerun_50k_12", _irv_run_scenario(50_000, 12, cached=True)),
+    Scenario("wc_ingest_5k_3q", _wc_ingest_scenario(5_000, {"President": 6, "Treasurer": 4, "Secretary": 3})),
+    Scenario("wc_ingest_100k_3q", _wc_ingest_scenario(100_000, {"President": 6, "Treasurer": 4, "Secretary": 3})),
+]
+
+
+def machine_tag() -> str:
+    """Tag identifying the machine and interpreter, so baselines are only compared like-for-like"""
+    tag = f"{platform.node()}-{platform.system()}-{platform.machine()}-py{sys.version_info[0]}.{sys.version_info[1]}"
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", tag)
+
+
+def _proc_status_kb(field: str) -> Optional[int]:
+    """A KiB field of /proc/self/status, e.g. "VmHWM" (peak RSS), or None if unavailable"""
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """Resets the kernel's peak RSS counter (Linux only), so the next peak is the scenario's own"""
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_kb() -> int:
+    """Peak resident set size in KiB (`ru_maxrss` is bytes on macOS), or 0 if unavailable"""
+    peak = _proc_status_kb("VmHWM")
+    if peak is not None:
+        return peak
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def measure(func: Callable[[], object], repeat: int = 5) -> dict[str, float]:
+    """
+    Times `func` and measures its memory.
+
+    Parameters
+    ----------
+    func : Callable[[], object]
+        Function to measure
+    repeat : int, optional
+        Number of timed runs. Default: 5
+
+    Returns
+    -------
+    measurement : dict[str, float]
+        Median and 95th percentile wall time in seconds, peak `tracemalloc` allocation in bytes,
+        and peak RSS in KiB. On Linux the peak RSS counter is reset first, so "peak_rss_kb" is the peak during
+        one run of `func`, and "rss_growth_kb" how far that run grew RSS. Elsewhere only the process peak so far
+        is available.
+    """
+    func()  # warm up imports and caches
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    gc.collect()
+    start_rss = _proc_status_kb("VmRSS")
+    measurement = {
+        "median_s": float(np.median(times)),
+        "p95_s": float(np.percentile(times, 95)),
+        "peak_tracemalloc_bytes": int(peak),
+    }
+    if _reset_peak_rss() and start_rss is not None:
+        func()
+        measurement["peak_rss_kb"] = _peak_rss_kb()
+        measurement["rss_growth_kb"] = max(0, measurement["peak_rss_kb"] - start_rss)
+    else:
+        measurement["peak_rss_kb"] = _peak_rss_kb()
+    return measurement
+
+
+def run_scenarios(scenarios: Optional[list[Scenario]] = None,
+                  repeat: int = 5,
+                  only: Optional[list[str]] = None) -> dict[str, dict[str, float]]:
+    """
+    Runs every scenario and returns measurements keyed by scenario name.
+
+    Parameters
+    ----------
+    scenarios : list[Scenario], optional
+        Scenarios to run. Default: `SCENARIOS`
+    repeat : int, optional
+        Number of timed runs per scenario. Default: 5
+    only : list[str], optional
+        If given, only runs scenarios with these names
+    """
+    scenarios = SCENARIOS if scenarios is None else scenarios
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for scenario in scenarios:
+            if only and scenario.name not in only:
+                continue
+            results[scenario.name] = measure(scenario.setup(folder), repeat=repeat)
+    return results
+
+
+def baseline_path(folder: str = BENCHMARK_FOLDER, tag: Optional[str] = None) -> str:
+    """Gets the baseline filepath for machine `tag` (default: this machine)"""
+    return os.path.join(folder, f"baseline-{tag or machine_tag()}.json")
+
+
+def save_baseline(results: dict[str, dict[str, float]], filepath: str) -> None:
+    """Writes `results` to `filepath` along with machine information"""
+    os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+    data = {
+        "machine": machine_tag(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scenarios": results,
+    }
+    with open(filepath, "w") as file:
+        json.dump(data, file, indent=2, sort_keys=True)
+
+
+def load_baseline(filepath: str) -> dict[str, dict[str, float]]:
+    """Reads the scenario measurements saved by `save_baseline`"""
+    with open(filepath) as file:
+        return json.load(file)["scenarios"]
+
+
+def compare(baseline: dict[str, dict[str, float]],
+            current: dict[str, dict[str, float]],
+            time_tolerance: float = 0.15,
+            p95_tolerance: float = 0.30,
+            memory_tolerance: float = 0.10) -> list[str]:
+    """
+    Compares `current` measurements against `baseline`.
+
+    Tolerances are relative: `time_tolerance=0.15` allows the median to be 15% slower than the baseline.
+    Scenarios missing from either side are skipped.
+
+    Returns
+    -------
+    regressions : list[str]
+        Human readable description of each regression. Empty if there are none.
+    """
+    tolerances = {
+        "median_s": time_tolerance,
+        "p95_s": p95_tolerance,
+        "peak_tracemalloc_bytes": memory_tolerance,
+        "peak_rss_kb": memory_tolerance,
+    }
+    regressions = []
+    for name in sorted(baseline.keys() & current.keys()):
+        for metric, tolerance in tolerances.items():
+            if metric not in baseline[name] or metric not in current[name]:
+                continue
+            old, new = baseline[name][metric], current[name][metric]
+            if new > old * (1 + tolerance):
+                change = 100 * (new - old) / old if old else float("inf")
+                regressions.append(f"{name}: {metric} regressed from {old:.6g} to {new:.6g} "
+                                   f"(+{change:.1f}%, tolerance {100 * tolerance:.0f}%)")
+    return regressions
+
+
+def format_results(results: dict[str, dict[str, float]]) -> str:
+    """Formats measurements as a table"""
+    lines = [f"{'scenario':<20}{'median (s)':>12}{'p95 (s)':>12}{'tracemalloc (MiB)':>20}{'rss (MiB)':>12}"
+             f"{'rss growth (MiB)':>18}"]
+    for name, m in results.items():
+        growth = f"{m['rss_growth_kb'] / 2**10:>18.1f}" if "rss_growth_kb" in m else f"{'-':>18}"
+        lines.append(f"{name:<20}{m['median_s']:>12.4f}{m['p95_s']:>12.4f}"
+                     f"{m['peak_tracemalloc_bytes'] / 2**20:>20.2f}{m['peak_rss_kb'] / 2**10:>12.1f}{growth}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark IRV tabulation and compare against a stored baseline.")
+    parser.add_argument("--save", action="store_true", help="Save results as this machine's baseline.")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help=f"Baseline JSON to use. Default: {baseline_path('$BENCHMARK_FOLDER')}")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per scenario.")
+    parser.add_argument("--only", type=str, nargs="*", default=None, help="Only run these scenarios.")
+    parser.add_argument("--time_tolerance", type=float, default=0.15, help="Allowed relative median slowdown.")
+    parser.add_argument("--p95_tolerance", type=float, default=0.30, help="Allowed relative p95 slowdown.")
+    parser.add_argument("--memory_tolerance", type=float, default=0.10, help="Allowed relative memory growth.")
+    args = parser.parse_args(argv)
+
+    filepath = args.baseline or baseline_path()
+    results = run_scenarios(repeat=args.repeat, only=args.only)
+    print(format_results(results))
+
+    if args.save:
+        save_baseline(results, filepath)
+        print(f"Baseline saved to {filepath}")
+        return 0
+
+    if not os.path.exists(filepath):
+        print(f"No baseline found at {filepath}. Run with --save first.", file=sys.stderr)
+        return 2
+
+    regressions = compare(load_baseline(filepath), results, args.time_tolerance,
+                          args.p95_tolerance, args.memory_tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    if not regressions:
+        print(f"No regressions against {filepath}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,2 +1,4 @@
 NO_CONFIDENCE = "No Confidence"
 UNBREAKABLE_TIE_WINNER = "No Confidence (unbreakable tie)"
+EXHAUSTED_LABEL = "Exhausted"
+MAX_TIE_STATES = 10000
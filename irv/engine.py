@@ -0,0 +1,456 @@
+import collections
+import json
+from typing import BinaryIO, Iterator, Optional, Union
+import numpy as np
+
+EXHAUSTED = -1
+"""Destination code of a ballot whose ranked candidates have all been eliminated"""
+TALLY_CACHE_BYTES = 2**26
+"""Default memory bound of each `TallyCache`"""
+ROW_OVERHEAD_BYTES = 64
+"""Working memory of one unique ballot in a counting pass, on top of one bool and one code per rank"""
+
+
+class TallyCache:
+    """
+    Least recently used cache of counts of one ballot store, keyed by the bitmask of active candidates.
+
+    Each entry holds the destinations (None for stores with a `memory_budget`) and tally of one active set,
+    see `EncodedBallots.count`.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        Total size of cached arrays kept before the least recently used are evicted.
+        0 disables caching. Default: `TALLY_CACHE_BYTES`
+
+    Attributes
+    ----------
+    hits, misses, evictions : int
+        Lookups answered from the cache, lookups that were not, and entries evicted, since creation
+    nbytes : int
+        Total size of cached arrays
+    """
+    __slots__ = ("max_bytes", "hits", "misses", "evictions", "nbytes", "_entries")
+
+    def __init__(self, max_bytes: int = TALLY_CACHE_BYTES):
+        self.max_bytes: int = max_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.nbytes: int = 0
+        self._entries: collections.OrderedDict = collections.OrderedDict()
+
+    @staticmethod
+    def key(active: np.ndarray) -> bytes:
+        """Bitmask of `active`, see `EncodedBallots.active_mask`"""
+        return np.packbits(active).tobytes()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _size(entry: tuple[Optional[np.ndarray], np.ndarray]) -> int:
+        return sum(array.nbytes for array in entry if array is not None)
+
+    def get(self, key: bytes) -> Optional[tuple[Optional[np.ndarray], np.ndarray]]:
+        """Cached (destinations, tally) of `key`, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: bytes, entry: tuple[Optional[np.ndarray], np.ndarray]) -> None:
+        """Caches `entry`, evicting the least recently used entries while over `max_bytes`"""
+        size = self._size(entry)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= self._size(evicted)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drops every entry, e.g. because the ballots changed. Statistics are kept."""
+        self._entries.clear()
+        self.nbytes = 0
+
+
+class EncodedBallots:
+    """
+    Compact int-coded ballot store used for vectorized counting.
+
+    Each row of `ranks` is a ranking with a weight. `from_votes` and `irv.readers` deduplicate, so each
+    row is a unique ranking. Stores that are views into `WildcatConnectionCSV.ballot_tensor` keep one row
+    per submission with weight 1 (0 if spoilt), so they share the tensor's memory and `ids` name every row.
+
+    Attributes
+    ----------
+    candidates : list[str]
+        Candidate names, sorted. `candidates[c]` is the name of candidate code `c`.
+    ranks : np.ndarray[int]
+        2D array of shape (rows, max ranks). `ranks[i, j]` is the code of the candidate
+        ranked `(j+1)`th on the `i`th row, or `EXHAUSTED` past the end of the ballot.
+    weights : np.ndarray[int]
+        Number of ballots cast with each row's ranking.
+        Rows with weight 0 (e.g. spoiled ballots in a shared tensor) are ignored.
+    inverse : np.ndarray[int]
+        Maps each original ballot to its row in `ranks`.
+    ids : np.ndarray[int] or None
+        Submission ID of each row in `ranks`, if the ballots came from an export with IDs.
+    memory_budget : int or None
+        Bytes of working memory each counting pass may use. If set, `ranks` and `weights` are read
+        `chunk_rows` rows at a time, so they can be memory-mapped files larger than RAM, see `irv.outofcore`.
+        `count` then keeps no destinations, so resident memory doesn't grow with the number of ballots;
+        use `count_transfers` and `ballot_destinations` for transfers and fates. None reads them whole.
+    cache : TallyCache
+        Counts of active sets already seen, see `count`. Assigning `candidates`, `ranks` or `weights`
+        clears it. `ranks` and `weights` are always read-only, so the cache can't go stale: arrays that can
+        still be written to, through themselves or the array they view, are copied when assigned.
+        Pass read-only arrays, e.g. memory maps opened with mode "r", to share memory instead.
+
+    Parameters
+    ----------
+    candidates : list[str]
+    ranks : np.ndarray[int]
+    weights : np.ndarray[int]
+    inverse : np.ndarray[int]
+    ids : np.ndarray[int], optional
+    memory_budget : int, optional
+    """
+    __slots__ = ("cache", "_candidates", "index", "_ranks", "_weights", "inverse", "ids", "memory_budget")
+
+    def __init__(self, candidates: list[str], ranks: np.ndarray, weights: np.ndarray, inverse: np.ndarray,
+                 ids: Optional[np.ndarray] = None, memory_budget: Optional[int] = None):
+        self.memory_budget: Optional[int] = memory_budget
+        self.cache: TallyCache = TallyCache()
+        self.candidates: list[str] = candidates
+        self.ranks: np.ndarray = ranks
+        self.weights: np.ndarray = weights
+        self.inverse: np.ndarray = inverse
+        self.ids: Optional[np.ndarray] = ids
+
+    def __reduce__(self):
+        # rebuilt with a fresh cache, and read-only arrays, e.g. when sent to worker processes
+        return _unpickle_encoded, (self._candidates, self._ranks, self._weights, self.inverse, self.ids,
+                                   self.memory_budget)
+
+    @property
+    def candidates(self) -> list[str]:
+        return self._candidates
+
+    @candidates.setter
+    def candidates(self, candidates: list[str]) -> None:
+        self._candidates = candidates
+        self.index: dict[str, int] = {name: code for code, name in enumerate(candidates)}
+        self.cache.clear()
+
+    @property
+    def ranks(self) -> np.ndarray:
+        return self._ranks
+
+    @ranks.setter
+    def ranks(self, ranks: np.ndarray) -> None:
+        self._ranks = read_only(ranks)
+        self.cache.clear()
+
+    @property
+    def weights(self) -> np.ndarray:
+        return self._weights
+
+    @weights.setter
+    def weights(self, weights: np.ndarray) -> None:
+        self._weights = read_only(weights)
+        self.cache.clear()
+
+    @classmethod
+    def from_votes(cls, votes: list[list[str]]) -> "EncodedBallots":
+        """Encodes and deduplicates `RankedChoiceBallots.votes`"""
+        candidates = sorted({candidate for ballot in votes for candidate in ballot})
+        index = {name: code for code, name in enumerate(candidates)}
+        unique, inverse = {}, np.empty(len(votes), dtype=np.int64)
+        for i, ballot in enumerate(votes):
+            inverse[i] = unique.setdefault(tuple(index[name] for name in ballot), len(unique))
+
+        width = max((len(ranking) for ranking in unique), default=0)
+        ranks = np.full((len(unique), max(width, 1)), EXHAUSTED, dtype=code_dtype(len(candidates)))
+        for row, ranking in enumerate(unique):
+            ranks[row, :len(ranking)] = ranking
+        weights = np.bincount(inverse, minlength=len(unique)).astype(np.int64)
+        # nothing else holds these, so freezing them saves a copy
+        ranks.flags.writeable = weights.flags.writeable = False
+        return cls(candidates, ranks, weights, inverse)
+
+    def decode(self) -> list[list[str]]:
+        """Converts back to `RankedChoiceBallots.votes` format, in original ballot order"""
+        names = np.array(self.candidates, dtype=object)
+        rows = self.ranks[self.inverse]
+        return [names[row[row != EXHAUSTED]].tolist() for row in rows]
+
+    def validate(self) -> None:
+        """Raises ValueError if any counted ballot ranks a candidate twice"""
+        for rows in self._row_slices():
+            ranks = np.sort(self.ranks[rows][self.weights[rows] > 0], axis=1)
+            if ((ranks[:, 1:] == ranks[:, :-1]) & (ranks[:, 1:] != EXHAUSTED)).any():
+                raise ValueError("There are duplicate votes in a single ballot!")
+
+    @property
+    def chunk_rows(self) -> Optional[int]:
+        """Unique ballots read per chunk under `memory_budget`, or None to read them all at once"""
+        if self.memory_budget is None:
+            return None
+        row_bytes = self.ranks.shape[1] * (self.ranks.itemsize + 1) + ROW_OVERHEAD_BYTES
+        return max(1, self.memory_budget // row_bytes)
+
+    def _row_slices(self) -> Iterator[slice]:
+        """Slices of rows to process one after another, see `chunk_rows`. Lazy, as there can be very many."""
+        chunk = self.chunk_rows
+        if chunk is None:
+            return iter([slice(None)])
+        return (slice(start, start + chunk) for start in range(0, len(self.ranks), chunk))
+
+    @property
+    def num_ballots(self) -> int:
+        """Total number of ballots, counting duplicates"""
+        return int(self.weights.sum())
+
+    def active_mask(self, active_candidates) -> np.ndarray:
+        """Boolean array over candidate codes, True for names in `active_candidates`"""
+        mask = np.zeros(len(self.candidates), dtype=bool)
+        mask[[self.index[name] for name in active_candidates]] = True
+        return mask
+
+    def destinations(self, active: np.ndarray) -> np.ndarray:
+        """
+        Finds the highest ranked active candidate on every row of `ranks`.
+
+        Parameters
+        ----------
+        active : np.ndarray[bool]
+            Active candidates, see `active_mask`
+
+        Returns
+        -------
+        destinations : np.ndarray[int]
+            Candidate code each row currently counts for, or `EXHAUSTED`
+        """
+        if self.chunk_rows is None:
+            return next(self._chunk_destinations(active))[1]
+        destinations = np.empty(len(self.ranks), dtype=self.ranks.dtype)
+        for rows, chunk in self._chunk_destinations(active):
+            destinations[rows] = chunk
+        return destinations
+
+    def _chunk_destinations(self, active: np.ndarray) -> Iterator[tuple[slice, np.ndarray]]:
+        """Helper for counting passes. `destinations` of each slice of `_row_slices`, one after another."""
+        # index -1 (EXHAUSTED padding) picks the trailing False
+        lookup = np.append(active, False)
+        for rows in self._row_slices():
+            yield rows, self._first_active(self.ranks[rows], lookup)
+
+    @staticmethod
+    def _first_active(ranks: np.ndarray, lookup: np.ndarray) -> np.ndarray:
+        """Helper for `destinations`. Highest ranked active candidate of each row of `ranks`."""
+        is_active = lookup[ranks]
+        first = is_active.argmax(axis=1)
+        rows = np.arange(len(ranks))
+        return np.where(is_active[rows, first], ranks[rows, first], EXHAUSTED)
+
+    def count(self, active: np.ndarray, cached: bool = True) -> tuple[Optional[np.ndarray], np.ndarray]:
+        """
+        `destinations` and `tally` of an active set, looked up in `cache` if it was counted before.
+
+        Parameters
+        ----------
+        active : np.ndarray[bool]
+            Active candidates, see `active_mask`
+        cached : bool, optional
+            Whether to use `cache`. It isn't thread safe, so threads sharing the store pass False. Default True
+
+        Returns
+        -------
+        destinations : np.ndarray[int] or None
+            See `destinations`. Read-only, as it is shared with the cache.
+            None with a `memory_budget`, as it would hold one code per row.
+        tally : np.ndarray[int]
+            See `tally`. Read-only, as it is shared with the cache.
+        """
+        key = TallyCache.key(active)
+        entry = self.cache.get(key) if cached else None
+        if entry is None:
+            if self.memory_budget is None:
+                destinations = self.destinations(active)
+                counts = self.tally(destinations)
+            else:
+                destinations = None
+                counts = np.zeros(len(self.candidates), dtype=np.int64)
+                for rows, chunk in self._chunk_destinations(active):
+                    counts += self._tally_chunk(chunk, self.weights[rows])
+            entry = (destinations, counts)
+            if cached and self.cache.max_bytes > 0:
+                for array in entry:
+                    if array is not None:
+                        array.flags.writeable = False
+                self.cache.put(key, entry)
+        return entry
+
+    def tally(self, destinations: np.ndarray) -> np.ndarray:
+        """Number of votes for each candidate code, given `destinations`"""
+        counts = np.zeros(len(self.candidates), dtype=np.int64)
+        for rows in self._row_slices():
+            counts += self._tally_chunk(destinations[rows], self.weights[rows])
+        return counts
+
+    def _tally_chunk(self, destinations: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Helper for `tally` and `count`. Votes for each candidate code from one chunk of rows."""
+        counted = destinations != EXHAUSTED
+        return np.bincount(destinations[counted], weights=weights[counted],
+                           minlength=len(self.candidates)).astype(np.int64)
+
+    def transfer_matrix(self, before: np.ndarray, after: np.ndarray) -> np.ndarray:
+        """
+        Counts the votes that moved between two sets of destinations.
+
+        Returns
+        -------
+        transfers : np.ndarray[int]
+            Array of shape (candidates, candidates + 1). `transfers[a, b]` is the number of votes that moved
+            from candidate `a` to candidate `b`; the last column holds votes that became exhausted.
+        """
+        num_candidates = len(self.candidates)
+        counts = np.zeros(num_candidates * (num_candidates + 1), dtype=np.int64)
+        for rows in self._row_slices():
+            counts += self._transfer_chunk(before[rows], after[rows], self.weights[rows])
+        return counts.reshape(num_candidates, num_candidates + 1)
+
+    def count_transfers(self, before: np.ndarray, after: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        `tally` of the `after` active set and the `transfer_matrix` from the `before` one, see `active_mask`,
+        in a single pass that reads each chunk of `ranks` once. For stores with a `memory_budget`, which
+        keep no destinations between counts.
+
+        Returns
+        -------
+        tally : np.ndarray[int]
+            See `tally`
+        transfers : np.ndarray[int]
+            See `transfer_matrix`
+        """
+        num_candidates = len(self.candidates)
+        before_lookup, after_lookup = np.append(before, False), np.append(after, False)
+        counts = np.zeros(num_candidates, dtype=np.int64)
+        transfers = np.zeros(num_candidates * (num_candidates + 1), dtype=np.int64)
+        for rows in self._row_slices():
+            ranks, weights = self.ranks[rows], self.weights[rows]
+            start, end = self._first_active(ranks, before_lookup), self._first_active(ranks, after_lookup)
+            counts += self._tally_chunk(end, weights)
+            transfers += self._transfer_chunk(start, end, weights)
+        return counts, transfers.reshape(num_candidates, num_candidates + 1)
+
+    def _transfer_chunk(self, before: np.ndarray, after: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Helper for `transfer_matrix` and `count_transfers`. Flattened transfers of one chunk of rows."""
+        num_candidates = len(self.candidates)
+        moved = (before != after) & (before != EXHAUSTED)
+        to = after[moved].astype(np.int64)
+        to[to == EXHAUSTED] = num_candidates
+        flat = before[moved].astype(np.int64) * (num_candidates + 1) + to
+        return np.bincount(flat, weights=weights[moved], minlength=num_candidates * (num_candidates + 1)).astype(np.int64)
+
+    def ballot_destinations(self, active: np.ndarray) -> Iterator[np.ndarray]:
+        """
+        Candidate code each original ballot counts for, or `EXHAUSTED`, in ballot order.
+
+        Yields
+        ------
+        destinations : np.ndarray[int]
+            Destinations of the next `chunk_rows` ballots, or of every ballot without a `memory_budget`
+        """
+        lookup = np.append(active, False)
+        chunk = self.chunk_rows or max(len(self.inverse), 1)
+        for start in range(0, len(self.inverse), chunk):
+            yield self._first_active(self.ranks[np.asarray(self.inverse[start:start + chunk])], lookup)
+
+    def appearances_in_rank(self, candidate: str, rank: int) -> int:
+        """Number of ballots ranking `candidate` `rank`th"""
+        if candidate not in self.index or rank > self.ranks.shape[1]:
+            return 0
+        code = self.index[candidate]
+        return sum(int(self.weights[rows][self.ranks[rows, rank - 1] == code].sum()) for rows in self._row_slices())
+
+
+def read_only(array: np.ndarray) -> np.ndarray:
+    """
+    Read-only view of `array`, so nothing can change it in place.
+
+    `array` is copied first if it, or any array it is a view of, can be written to.
+    """
+    base = array
+    while isinstance(base, np.ndarray):
+        if base.flags.writeable:
+            array = array.copy()
+            break
+        base = base.base
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+def code_dtype(num_candidates: int) -> type:
+    """Smallest signed integer type that fits every candidate code and `EXHAUSTED`"""
+    return np.int8 if num_candidates < 2**7 else np.int16 if num_candidates < 2**15 else np.int32
+
+
+def save_encoded(file: Union[str, BinaryIO], question_ballots: dict[str, EncodedBallots]) -> None:
+    """
+    Saves encoded ballots of one or more questions to a compressed `.npz` file.
+
+    Parameters
+    ----------
+    file : str or file-like
+        Where to save
+    question_ballots : dict[str, EncodedBallots]
+        Maps question name to its encoded ballots
+    """
+    arrays = {}
+    meta = []
+    for i, (question, encoded) in enumerate(question_ballots.items()):
+        meta.append({"question": question, "candidates": encoded.candidates})
+        arrays[f"{i}/ranks"] = encoded.ranks
+        arrays[f"{i}/weights"] = encoded.weights
+        arrays[f"{i}/inverse"] = encoded.inverse
+        if encoded.ids is not None:
+            arrays[f"{i}/ids"] = encoded.ids
+    arrays["meta"] = np.array(json.dumps(meta))
+    np.savez_compressed(file, **arrays)
+
+
+def load_encoded(file: Union[str, BinaryIO]) -> dict[str, EncodedBallots]:
+    """Loads encoded ballots saved by `save_encoded`"""
+    with np.load(file, allow_pickle=False) as arrays:
+        meta = json.loads(str(arrays["meta"]))
+        return {
+            entry["question"]: EncodedBallots(
+                entry["candidates"],
+                _loaded(arrays[f"{i}/ranks"]),
+                _loaded(arrays[f"{i}/weights"]),
+                arrays[f"{i}/inverse"],
+                ids=arrays[f"{i}/ids"] if f"{i}/ids" in arrays else None
+            )
+            for i, entry in enumerate(meta)
+        }
+
+
+def _loaded(array: np.ndarray) -> np.ndarray:
+    """Helper for `load_encoded`. Freezes a freshly loaded array, which nothing else holds, see `read_only`."""
+    array.flags.writeable = False
+    return array
+
+
+def _unpickle_encoded(candidates: list[str], ranks: np.ndarray, weights: np.ndarray, *args) -> EncodedBallots:
+    """Helper for `EncodedBallots.__reduce__`. The unpickled arrays are fresh, so are frozen rather than copied."""
+    return EncodedBallots(candidates, _loaded(ranks), _loaded(weights), *args)
@@ -1,3 +1,4 @@
 import os
 
 LOGGING_FOLDER = os.environ.get("LOGGING_FOLDER", "logs")
+BENCHMARK_FOLDER = os.environ.get("BENCHMARK_FOLDER", "benchmarks")
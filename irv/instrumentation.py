@@ -0,0 +1,236 @@
+import cProfile
+import contextlib
+import io
+import pstats
+import tracemalloc
+from typing import Iterator, Optional
+
+
+class StageEvent:
+    """
+    Emitted when a tabulation stage (parsing, validation, counting, writing, ...) finishes.
+
+    Attributes
+    ----------
+    stage : str
+        Name of the stage, e.g. "parse" or "tabulate"
+    duration : float
+        Wall time of the stage in seconds
+    source : str
+        Election or file the stage ran for
+    ballots : int
+        Number of ballots the stage touched
+    """
+    def __init__(self, stage: str, duration: float, source: str = "", ballots: int = 0):
+        self.stage = stage
+        self.duration = duration
+        self.source = source
+        self.ballots = ballots
+
+    def __repr__(self) -> str:
+        return f"StageEvent({self.stage!r}, {self.duration:.6f}s, source={self.source!r}, ballots={self.ballots})"
+
+
+class RoundEvent:
+    """
+    Emitted by `IRVElection.run` after every round.
+
+    Attributes
+    ----------
+    election : str
+        Name of the election
+    round : int
+        Round number, starting at zero
+    duration : float
+        Wall time of the round in seconds, including tie breaking
+    ballots : int
+        Number of ballots examined while counting
+    eliminated : dict[str, int]
+        Candidates removed this round and their tallies
+    transfers : int
+        Number of votes held by eliminated candidates, which move to the next choice (or exhaust) next round
+    tie_break_depth : int
+        Number of ranks examined to break a tie. 0 if there was no tie to break.
+    """
+    def __init__(self, election: str, round: int, duration: float, ballots: int,
+                 eliminated: dict, tie_break_depth: int = 0):
+        self.election = election
+        self.round = round
+        self.duration = duration
+        self.ballots = ballots
+        self.eliminated = eliminated
+        self.transfers = sum(eliminated.values())
+        self.tie_break_depth = tie_break_depth
+
+    def __repr__(self) -> str:
+        return (f"RoundEvent({self.election!r}, round={self.round}, {self.duration:.6f}s, "
+                f"eliminated={self.eliminated}, tie_break_depth={self.tie_break_depth})")
+
+
+class CacheEvent:
+    """
+    Emitted by `IRVElection.run` with the tally cache activity of the run, see `irv.engine.TallyCache`.
+
+    Attributes
+    ----------
+    election : str
+        Name of the election
+    hits : int
+        Counts answered from the cache
+    misses : int
+        Counts that had to be computed
+    evictions : int
+        Cache entries evicted to stay within its memory bound
+    entries : int
+        Entries in the cache after the run
+    nbytes : int
+        Size of the cache after the run, in bytes
+    """
+    def __init__(self, election: str, hits: int, misses: int, evictions: int = 0, entries: int = 0,
+                 nbytes: int = 0):
+        self.election = election
+        self.hits = hits
+        self.misses = misses
+        self.evictions = evictions
+        self.entries = entries
+        self.nbytes = nbytes
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of counts answered from the cache"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __repr__(self) -> str:
+        return (f"CacheEvent({self.election!r}, hits={self.hits}, misses={self.misses}, "
+                f"evictions={self.evictions}, entries={self.entries}, nbytes={self.nbytes})")
+
+
+class ElectionObserver:
+    """
+    Receives instrumentation events from `IRVElection` and `WildcatConnectionCSV`.
+
+    Subclass and override the hooks you need; every hook is a no-op by default.
+    Objects only emit events when an observer is passed in, so there is no cost otherwise.
+    """
+    def on_stage(self, event: StageEvent) -> None:
+        """Called when a stage finishes"""
+        pass
+
+    def on_round(self, event: RoundEvent) -> None:
+        """Called when an IRV round finishes"""
+        pass
+
+    def on_cache(self, event: CacheEvent) -> None:
+        """Called with the tally cache activity of an election run"""
+        pass
+
+
+class TimingCollector(ElectionObserver):
+    """
+    Built-in observer that collects every event and summarizes where the time went.
+
+    Attributes
+    ----------
+    stages : list[StageEvent]
+        Stage events in the order received
+    rounds : list[RoundEvent]
+        Round events in the order received
+    caches : list[CacheEvent]
+        Cache events in the order received
+    peak_memory : int or None
+        Peak traced memory in bytes, if recorded with `profiling(trace_memory=True)`
+    """
+    def __init__(self):
+        self.stages: list[StageEvent] = []
+        self.rounds: list[RoundEvent] = []
+        self.caches: list[CacheEvent] = []
+        self.peak_memory: Optional[int] = None
+
+    def on_stage(self, event: StageEvent) -> None:
+        self.stages.append(event)
+
+    def on_round(self, event: RoundEvent) -> None:
+        self.rounds.append(event)
+
+    def on_cache(self, event: CacheEvent) -> None:
+        self.caches.append(event)
+
+    def stage_totals(self) -> dict[str, float]:
+        """Total seconds spent in each stage"""
+        totals = {}
+        for event in self.stages:
+            totals[event.stage] = totals.get(event.stage, 0.0) + event.duration
+        return totals
+
+    def summary(self) -> str:
+        """Generates a human readable timing summary"""
+        lines = ['==========',
+                 '= TIMING =',
+                 '==========']
+        for stage, total in self.stage_totals().items():
+            count = sum(1 for event in self.stages if event.stage == stage)
+            lines.append(f"{stage:<12} {total:10.4f}s  ({count} call{'s' if count != 1 else ''})")
+
+        if self.rounds:
+            slowest = max(self.rounds, key=lambda event: event.duration)
+            lines.append(f"{len(self.rounds)} rounds, {sum(e.duration for e in self.rounds):.4f}s total; "
+                         f"slowest was round {slowest.round + 1} of {slowest.election} ({slowest.duration:.4f}s)")
+            ties = [event for event in self.rounds if event.tie_break_depth]
+            if ties:
+                lines.append(f"{len(ties)} tie breaks, deepest examined {max(e.tie_break_depth for e in ties)} ranks")
+        if self.caches:
+            hits, misses = sum(event.hits for event in self.caches), sum(event.misses for event in self.caches)
+            lines.append(f"Tally cache: {hits} hits, {misses} misses "
+                         f"({hits / max(hits + misses, 1):.0%} hit rate), "
+                         f"{sum(event.evictions for event in self.caches)} evictions")
+        if self.peak_memory is not None:
+            lines.append(f"Peak traced memory: {self.peak_memory / 2**20:.2f} MiB")
+        return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def profiling(collector: Optional[TimingCollector] = None,
+              cprofile_output: Optional[str] = None,
+              trace_memory: bool = False) -> Iterator[Optional[cProfile.Profile]]:
+    """
+    Context manager for optional cProfile and tracemalloc capture.
+
+    Parameters
+    ----------
+    collector : TimingCollector, optional
+        Receives the peak traced memory if `trace_memory` is set
+    cprofile_output : str, optional
+        If given, profiles the block with cProfile and dumps stats to this file
+        (readable with `pstats` or snakeviz)
+    trace_memory : bool, optional
+        Whether to trace memory allocations with tracemalloc. Default: False
+
+    Yields
+    ------
+    profiler : cProfile.Profile or None
+        The running profiler, if any
+    """
+    profiler = cProfile.Profile() if cprofile_output else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield profiler
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cprofile_output)
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            if collector is not None:
+                collector.peak_memory = peak
+
+
+def top_functions(cprofile_output: str, limit: int = 15) -> str:
+    """Formats the `limit` functions with the highest cumulative time from a cProfile dump"""
+    stream = io.StringIO()
+    pstats.Stats(cprofile_output, stream=stream).sort_stats("cumulative").print_stats(limit)
+    return stream.getvalue()
@@ -3,12 +3,18 @@ import os
 from io import TextIOBase
 import logging
 import datetime
+import time
 import warnings
 from copy import deepcopy
+from typing import Iterator, Optional
+
+import numpy as np
 
 from irv.ballots import RankedChoiceBallots
 from . import LOGGING_FOLDER
-from .constants import UNBREAKABLE_TIE_WINNER, NO_CONFIDENCE
+from .constants import UNBREAKABLE_TIE_WINNER, NO_CONFIDENCE, EXHAUSTED_LABEL, MAX_TIE_STATES
+from .results import format_results
+from .instrumentation import CacheEvent, ElectionObserver, RoundEvent, StageEvent
 
 
 class IRVElection:
@@ -24,6 +30,7 @@ class IRVElection:
             # this is a comment
             A,B,C
             C,B
+        - Read with `irv.readers.load_ballots`, which also reads BLT files
 
     Parameters
     ----------
@@ -38,6 +45,19 @@ class IRVElection:
         - Whether to save logs to a timestamped file.
         Logs folder can be set by environment variable `LOGGING_FOLDER`.
         Default False
+    name : str, optional
+        - Name of the election, used in instrumentation events. Default None
+    observer : ElectionObserver, optional
+        - Receives per-round and per-stage instrumentation events.
+        See `irv.instrumentation`. Default None
+    analyze_ties : boolean, optional
+        - Whether to follow every elimination order when the count ends in an unbreakable tie,
+        to find out if the tie changes the winner. See `irv.ties`. Default False
+    tie_branch_budget : int, optional
+        - Most sets of standing candidates counted by the tie analysis. Default 10000
+    record_transfers : boolean, optional
+        - Whether `run` records where the votes of eliminated candidates went, see `transfers`.
+        Set by `irv --transfers_output`. Default False, so reruns for audits and analyses don't pay for it
 
     Attributes
     ----------
@@ -46,17 +66,46 @@ class IRVElection:
         a list of str.
     candidates : set[str]
         - set of candidate names
+    transfers : list[np.ndarray[int]]
+        - Filled by `run` with `record_transfers`. `transfers[i]` records where the votes of the candidates eliminated
+        in round `i+1` went, see `EncodedBallots.transfer_matrix`. Rows and columns follow
+        `ballots.encoded.candidates`, and the last column counts newly exhausted ballots.
+    ballot_fates : np.ndarray[int] or None
+        - Filled by `run`. Candidate code (index into `ballots.encoded.candidates`) each ballot
+        counted for in the final round, or -1 if it was exhausted. Built on each access, from the final
+        destinations of the unique ballots, or chunk by chunk if the ballots have a `memory_budget`.
+    tie_analysis : irv.ties.TieAnalysis or None
+        - Filled by `run` with `analyze_ties` if the count ended in an unbreakable tie.
 
     """
+    __slots__ = ("ballots", "candidates", "remove_exhausted_ballots", "log_to_stderr", "name", "observer",
+                 "analyze_ties", "tie_branch_budget", "_tie_break_depth", "transfers", "tie_analysis", "_destinations",
+                 "_active", "record_transfers", "_logger")
+
     def __init__(self,
                  ballots: RankedChoiceBallots,
                  remove_exhausted_ballots: bool = False,
                  log_to_stderr: bool = False,
-                 save_log: bool = False):
+                 save_log: bool = False,
+                 name: Optional[str] = None,
+                 observer: Optional[ElectionObserver] = None,
+                 analyze_ties: bool = False,
+                 tie_branch_budget: int = MAX_TIE_STATES,
+                 record_transfers: bool = False):
         self.ballots: RankedChoiceBallots = ballots
         self.candidates: set = ballots.get_candidates()
         self.remove_exhausted_ballots: bool = remove_exhausted_ballots
         self.log_to_stderr: bool = log_to_stderr
+        self.name: str = name or ""
+        self.observer: Optional[ElectionObserver] = observer
+        self.analyze_ties: bool = analyze_ties
+        self.tie_branch_budget: int = tie_branch_budget
+        self.record_transfers: bool = record_transfers
+        self._tie_break_depth: int = 0
+        self.transfers: list[np.ndarray] = []
+        self.tie_analysis = None
+        self._destinations: Optional[np.ndarray] = None
+        self._active: Optional[np.ndarray] = None
         self._setup_logger_handler(save_log, log_to_stderr)
 
     def _setup_logger_handler(self, save_log: bool, log_to_stderr: bool) -> None:
@@ -101,23 +150,10 @@ class IRVElection:
         steps : list[dict]
             - Array of dictionaries storing candidate tallies at each stage
         """
-        winner_line = f'= WINNER: {winner} ='
-        lines = ['=' * len(winner_line),
-                 winner_line,
-                 '=' * len(winner_line),
-                 f"There were {len(self.ballots.votes)} total ballots cast"]
-
-        if winner not in [NO_CONFIDENCE, UNBREAKABLE_TIE_WINNER]:
-            percent_votes = round(100*steps[-1][winner]/len(self.ballots.votes), 2)
-            lines.append(f"In the final round, {winner} received {steps[-1][winner]} votes, or {percent_votes}%")
-        lines.append('\n')
-        lines.append('==========')
-        lines.append('= ROUNDS =')
-        lines.append('==========')
-        # TODO: sort steps, do nothing, or keep order consistent?
-        for i in range(len(steps)):
-            lines.append(f'Round {i+1}: {steps[i]}')
-        return "\n".join(lines)
+        results = format_results(winner, steps, len(self.ballots))
+        if self.tie_analysis is not None:
+            results += f"\n\n{self.tie_analysis.summary()}"
+        return results
 
     def write_results(self, winner: str, steps: list[dict], output_file: str) -> None:
         """
@@ -138,6 +174,59 @@ class IRVElection:
         with open(output_file, 'w') as f:
             f.write(results_string)
 
+    def transfer_dicts(self) -> list[dict[str, dict[str, int]]]:
+        """
+        Converts `self.transfers` to names, omitting zero entries.
+
+        Returns
+        -------
+        transfers : list[dict[str, dict[str, int]]]
+            `transfers[i][a][b]` is the number of votes that moved from `a` to `b` after round `i+1`.
+            Exhausted ballots use the name "Exhausted".
+        """
+        names = self.ballots.encoded.candidates + [EXHAUSTED_LABEL]
+        transfer_dicts = []
+        for matrix in self.transfers:
+            round_transfers = {}
+            for source, destination in zip(*np.nonzero(matrix)):
+                round_transfers.setdefault(names[source], {})[names[destination]] = int(matrix[source, destination])
+            transfer_dicts.append(round_transfers)
+        return transfer_dicts
+
+    def write_transfers(self, transfers_file: str, fates_file: Optional[str] = None) -> None:
+        """
+        Writes the transfers recorded by `run` as CSV, and optionally the final destination of every ballot.
+        Needs `record_transfers`.
+
+        Parameters
+        ----------
+        transfers_file : string
+            - CSV file with columns round,from,to,votes. Only non-zero transfers are written.
+        fates_file : string, optional
+            - File with one line per ballot, in ballot order, naming the candidate that ballot counted for
+            in the final round, or "Exhausted"
+
+        Raises
+        ------
+        ValueError
+            If the election wasn't created with `record_transfers`
+        """
+        if not self.record_transfers:
+            raise ValueError("Transfers are only recorded with record_transfers=True!")
+        with open(transfers_file, 'w') as f:
+            f.write("round,from,to,votes\n")
+            for i, round_transfers in enumerate(self.transfer_dicts()):
+                for source, destinations in round_transfers.items():
+                    for destination, votes in destinations.items():
+                        f.write(f'{i + 1},"{source}","{destination}",{votes}\n')
+
+        if fates_file is not None and self._active is not None:
+            names = np.array(self.ballots.encoded.candidates + [EXHAUSTED_LABEL], dtype=object)
+            with open(fates_file, 'w') as f:
+                # one chunk at a time, so out-of-core ballots never need every fate in memory
+                for i, fates in enumerate(self._fate_chunks()):
+                    f.write(("\n" if i else "") + "\n".join(names[fates]))
+
     def run(self) -> tuple[str, list[dict]]:
         """
         Runs the election
@@ -157,11 +246,41 @@ class IRVElection:
         steps : list[dict]
             - Array of dictionaries storing candidate tallies at each stage
         """
+        self.tie_analysis = None
+        if self.observer is None:
+            winner, steps = self._run()
+            if winner == UNBREAKABLE_TIE_WINNER and self.analyze_ties:
+                self._analyze_ties()
+            return winner, steps
+
+        cache = self.ballots.encoded.cache
+        hits, misses, evictions = cache.hits, cache.misses, cache.evictions
+        start = time.perf_counter()
+        winner, steps = self._run()
+        self.observer.on_stage(StageEvent("tabulate", time.perf_counter() - start, self.name,
+                                          len(self.ballots) * len(steps)))
+        self.observer.on_cache(CacheEvent(self.name, cache.hits - hits, cache.misses - misses,
+                                          cache.evictions - evictions, len(cache), cache.nbytes))
+        if winner == UNBREAKABLE_TIE_WINNER and self.analyze_ties:
+            start = time.perf_counter()
+            self._analyze_ties()
+            self.observer.on_stage(StageEvent("tie_analysis", time.perf_counter() - start, self.name,
+                                              len(self.ballots) * self.tie_analysis.states))
+        return winner, steps
+
+    def _analyze_ties(self) -> None:
+        """Helper for `run`. Fills `tie_analysis`, see `irv.ties.analyze_ties`."""
+        from .ties import analyze_ties
+        self.tie_analysis = analyze_ties(self, self.tie_branch_budget)
+        self._logger.info(self.tie_analysis.summary())
 
+    def _run(self) -> tuple[str, list[dict]]:
+        """Helper for `run`. Runs the election without the tabulate stage event."""
         tallies = collections.Counter()
         for name in self.candidates:
             tallies[name] = 0
         steps = []
+        self.transfers, self._destinations, self._active = [], None, None
 
         if len(tallies) == 0:
             self._logger.warning(
@@ -175,34 +294,83 @@ class IRVElection:
 
         rund = 0
         while len(tallies) > 1:
+            round_start = time.perf_counter() if self.observer is not None else 0.0
+            self._tie_break_depth = 0
             tallies, removed = self.one_round(tallies, rund=rund)
             complete_step = deepcopy(removed)
             complete_step.update(tallies)
             steps.append(complete_step)
+            if self.observer is not None:
+                self._emit_round(rund, round_start, removed)
             if len(removed) == 0:
                 front_runner = tallies.most_common(1)[0][0]
-                percent_front_runner = tallies[front_runner] / (len(self.ballots.votes))
+                percent_front_runner = tallies[front_runner] / (len(self.ballots))
                 if percent_front_runner > 0.5:  # we only have nothing removed if majority
                     return front_runner, steps
                 else:  # or if a tie cannot be broken
                     return UNBREAKABLE_TIE_WINNER, steps
             rund += 1
 
+        round_start = time.perf_counter() if self.observer is not None else 0.0
         tallies = self.count_vals(tallies)
         steps.append(tallies)
+        if self.observer is not None:
+            self._emit_round(rund, round_start, {})
 
         winner = list(tallies.keys())[0]
-        if not self.remove_exhausted_ballots and tallies[winner]/(len(self.ballots.votes)) <= 0.5:
+        if not self.remove_exhausted_ballots and tallies[winner]/(len(self.ballots)) <= 0.5:
             self._logger.info(
                 f"""
                 No confidence vote! Winner: {winner} received {tallies[winner]} votes
-                out of {len(self.ballots.votes)} ballots
+                out of {len(self.ballots)} ballots
                 """
             )
             winner = NO_CONFIDENCE
 
         return winner, steps
 
+    def _count(self, active: np.ndarray) -> np.ndarray:
+        """
+        Helper for `count_vals`. Tally of the `active` candidates, keeping their destinations if the ballots
+        are in memory, and with `record_transfers` recording the transfers since the previous count.
+        With a `memory_budget`, the transfers come from the same pass over the ballots as the tally,
+        see `EncodedBallots.count_transfers`.
+        """
+        encoded = self.ballots.encoded
+        previous_active, previous_destinations = self._active, self._destinations
+        self._active = active
+        if not self.record_transfers or previous_active is None:
+            self._destinations, counts = encoded.count(active)
+        elif encoded.memory_budget is not None:
+            self._destinations = None
+            counts, transfers = encoded.count_transfers(previous_active, active)
+            self.transfers.append(transfers)
+        else:
+            self._destinations, counts = encoded.count(active)
+            self.transfers.append(encoded.transfer_matrix(previous_destinations, self._destinations))
+        return counts
+
+    @property
+    def ballot_fates(self) -> Optional[np.ndarray]:
+        if self._active is None:
+            return None
+        return np.concatenate(list(self._fate_chunks()))
+
+    def _fate_chunks(self) -> Iterator[np.ndarray]:
+        """Helper for `ballot_fates` and `write_transfers`. Final destinations of the ballots, chunk by chunk."""
+        encoded = self.ballots.encoded
+        if self._destinations is not None:
+            yield self._destinations[encoded.inverse]
+        else:
+            yield from encoded.ballot_destinations(self._active)
+
+    def _emit_round(self, rund: int, round_start: float, removed: dict) -> None:
+        """Sends a `RoundEvent` to the observer"""
+        self.observer.on_round(RoundEvent(
+            self.name, rund, time.perf_counter() - round_start, len(self.ballots),
+            dict(removed), self._tie_break_depth
+        ))
+
     def one_round(self, tallies: collections.Counter, rund: int = -1) -> tuple[collections.Counter, dict]:
         """
         Helper to run one round of IRV
@@ -242,23 +410,22 @@ class IRVElection:
         """
         Helper to count, but not modify, the tallies at any step
         Used by one_count and run (for final tally count)
+
+        Counting is a single vectorized pass over the encoded ballots, see `EncodedBallots.destinations`,
+        or a lookup if these candidates were counted before, see `EncodedBallots.count`.
+        The destination of every ballot is kept for tracking transfers, unless the ballots have a `memory_budget`.
         """
         active_candidates = set(tallies.keys())  # set for ``permutation independence''
+        encoded = self.ballots.encoded
+        counts = self._count(encoded.active_mask(active_candidates))
+
         new_tallies = collections.Counter()
         for name in active_candidates:
-            new_tallies[name] = 0
-
-        for i, ballot in enumerate(self.ballots.votes):  # self.ballots.votes[i] == ballot
-            for candidate in ballot:
-                if candidate in active_candidates:
-                    new_tallies[candidate] += 1
-                    break
+            new_tallies[name] = int(counts[encoded.index[name]])
 
         self._logger.info(f"Round {rund}: New tallies are {new_tallies}")
         return new_tallies
 
-
-
     def remove_candidates(self, new_tallies: collections.Counter, min_names: list[str], sort_tallies:
                           list[tuple[int, str]]) -> tuple[collections.Counter, dict]:
         """
@@ -270,7 +437,7 @@ class IRVElection:
 
         removed = {}
         # don't bother removing if one candidate already has a majority
-        if sort_tallies[-1][1] <= len(self.ballots.votes) / 2:
+        if sort_tallies[-1][1] <= len(self.ballots) / 2:
             if len(min_names) == 1:
                 loser = min_names[0]
                 removed = {loser: new_tallies.pop(loser)}
@@ -309,7 +476,24 @@ class IRVElection:
         """
 
         self._logger.info(f"Breaking ties between {tied_candidates}!")
+        losers, tied_candidates = self.refine_tie(tied_candidates, tallies)
+        if not losers:
+            warnings.warn(f"Unbreakable tie between {tied_candidates}, new election needed")
+        return losers
+
+    def refine_tie(self,
+                   tied_candidates: list[str],
+                   tallies: collections.Counter) -> tuple[list[str], list[str]]:
+        """
+        Tie breaking rules of `break_ties`, without warning when they fail.
 
+        Returns
+        -------
+        losers : list[str]
+            - The losing candidate(s), or an empty list if the tie is unbreakable
+        still_tied : list[str]
+            - The candidates left tied after comparing every rank, if the tie is unbreakable, else `losers`
+        """
         # determine min non-tied tally
         sort_tallies = tallies.most_common()[::-1]
         tied_val = sort_tallies[0][1]
@@ -326,7 +510,7 @@ class IRVElection:
 
         # check at the beginning as well
         if self.can_remove_all(tied_candidates, min_nt, tied_val):
-            return tied_candidates
+            return tied_candidates, tied_candidates
 
         for rank in range(1, len(self.ballots.get_candidates()) + 1):
             min_names = []
@@ -340,11 +524,11 @@ class IRVElection:
                     min_names.append(name)
 
             tied_candidates = min_names
+            self._tie_break_depth = rank
             if self.can_remove_all(min_names, min_nt, tied_val):
-                return min_names
+                return min_names, min_names
 
-        warnings.warn(f"Unbreakable tie between {tied_candidates}, new election needed")
-        return []
+        return [], tied_candidates
 
     def can_remove_all(self, tied_candidates: list[str], min_non_tied: int, tied_val: int):
         """
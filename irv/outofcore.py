@@ -0,0 +1,150 @@
+"""
+Out-of-core tabulation of elections with more ballots than fit in RAM.
+
+Encoded ballots are stored as raw arrays in a folder and memory-mapped back, and every counting pass
+reads them in chunks sized by a memory budget, see `EncodedBallots.memory_budget`:
+
+    with MemmapWriter("ballots/", candidates, width=6) as writer:
+        for part in parts:                       # e.g. `irv.readers.read_csv` of each file of a big export
+            writer.append(part)
+    ballots = RankedChoiceBallots(encoded=open_memmap("ballots/", memory_budget=2**28))
+    winner, steps = IRVElection(ballots).run()
+
+Counting chunk by chunk adds up the same integer tallies as counting everything at once, so the steps
+and winner are exactly those of the in-memory engine. Resident memory is the working chunk and the tally
+cache (capped at the budget), whatever the number of ballots: no destinations are kept between passes,
+so recorded transfers are counted in the same pass as the tally, see `EncodedBallots.count_transfers`.
+"""
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+from .engine import EXHAUSTED, TALLY_CACHE_BYTES, EncodedBallots, TallyCache, code_dtype
+
+META_FILENAME = "meta.json"
+ARRAY_FILENAMES = ("ranks", "weights", "inverse", "ids")
+
+
+class MemmapWriter:
+    """
+    Builds a memory-mappable ballot store in `folder` by appending `EncodedBallots` chunk by chunk,
+    so the full election never has to be in memory at once.
+
+    Rows are not deduplicated across chunks, which changes nothing but the number of rows.
+    Use as a context manager, or call `close` when done; the store can't be opened before.
+
+    Parameters
+    ----------
+    folder : str
+        Folder to write. Existing stores in it are overwritten.
+    candidates : list[str]
+        Every candidate name. Chunks may use any subset, in any order.
+    width : int
+        Most ranks on any ballot. Narrower chunks are padded with `EXHAUSTED`.
+    """
+    def __init__(self, folder: str, candidates: list[str], width: int):
+        self.folder: str = folder
+        self.candidates: list[str] = sorted(candidates)
+        self.width: int = max(width, 1)
+        self.dtype: type = code_dtype(len(self.candidates))
+        self.num_rows: int = 0
+        self.num_ballots: int = 0
+        self.has_ids: Optional[bool] = None
+        self._index: dict[str, int] = {name: code for code, name in enumerate(self.candidates)}
+        os.makedirs(folder, exist_ok=True)
+        self._files = {name: open(os.path.join(folder, f"{name}.bin"), "wb") for name in ARRAY_FILENAMES}
+
+    def append(self, encoded: EncodedBallots) -> None:
+        """
+        Appends the ballots of `encoded`, after those already written.
+
+        Raises
+        ------
+        ValueError
+            If `encoded` has unknown candidates or more ranks than `width`, or has IDs when earlier chunks
+            didn't (or the other way round)
+        """
+        unknown = set(encoded.candidates) - set(self._index)
+        if unknown:
+            raise ValueError(f"Ballots rank candidates missing from the store: {sorted(unknown)}")
+        if encoded.ranks.shape[1] > self.width and (encoded.ranks[:, self.width:] != EXHAUSTED).any():
+            raise ValueError(f"Ballots rank more than {self.width} candidates!")
+        if self.has_ids is None:
+            self.has_ids = encoded.ids is not None
+        elif self.has_ids != (encoded.ids is not None):
+            raise ValueError("Either every chunk or none of them must have submission IDs!")
+
+        # last entry maps EXHAUSTED padding to itself
+        recode = np.array([self._index[name] for name in encoded.candidates] + [EXHAUSTED], dtype=self.dtype)
+        ranks = np.full((len(encoded.ranks), self.width), EXHAUSTED, dtype=self.dtype)
+        width = min(self.width, encoded.ranks.shape[1])
+        ranks[:, :width] = recode[encoded.ranks[:, :width]]
+        self._files["ranks"].write(ranks.tobytes())
+        self._files["weights"].write(np.asarray(encoded.weights, dtype=np.int64).tobytes())
+        self._files["inverse"].write((np.asarray(encoded.inverse, dtype=np.int64) + self.num_rows).tobytes())
+        if self.has_ids:
+            self._files["ids"].write(np.asarray(encoded.ids, dtype=np.int64).tobytes())
+        self.num_rows += len(ranks)
+        self.num_ballots += len(encoded.inverse)
+
+    def close(self) -> None:
+        """Finishes the files and writes the metadata `open_memmap` reads"""
+        for file in self._files.values():
+            file.close()
+        meta = {"candidates": self.candidates, "width": self.width, "dtype": np.dtype(self.dtype).name,
+                "rows": self.num_rows, "ballots": self.num_ballots, "has_ids": bool(self.has_ids)}
+        with open(os.path.join(self.folder, META_FILENAME), "w") as file:
+            json.dump(meta, file, indent=2)
+
+    def __enter__(self) -> "MemmapWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def save_memmap(folder: str, encoded: EncodedBallots) -> None:
+    """Saves `encoded` to `folder` in the format `open_memmap` reads"""
+    with MemmapWriter(folder, encoded.candidates, encoded.ranks.shape[1]) as writer:
+        writer.append(encoded)
+
+
+def open_memmap(folder: str, memory_budget: int = TALLY_CACHE_BYTES) -> EncodedBallots:
+    """
+    Memory-maps ballots saved by `MemmapWriter` or `save_memmap`, read-only.
+
+    Parameters
+    ----------
+    folder : str
+        Folder of the store
+    memory_budget : int, optional
+        Bytes of working memory of each counting pass, see `EncodedBallots.memory_budget`.
+        The tally cache is capped at the same size. Default: `TALLY_CACHE_BYTES`
+
+    Returns
+    -------
+    ballots : EncodedBallots
+        Ballots backed by the files in `folder`
+    """
+    with open(os.path.join(folder, META_FILENAME)) as file:
+        meta = json.load(file)
+
+    def array(name: str, dtype, shape: tuple) -> np.ndarray:
+        # np.memmap can't map empty files
+        if 0 in shape:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(os.path.join(folder, f"{name}.bin"), dtype=dtype, mode="r", shape=shape)
+
+    rows = meta["rows"]
+    encoded = EncodedBallots(
+        meta["candidates"],
+        array("ranks", np.dtype(meta["dtype"]), (rows, meta["width"])),
+        array("weights", np.int64, (rows,)),
+        array("inverse", np.int64, (meta["ballots"],)),
+        ids=array("ids", np.int64, (rows,)) if meta["has_ids"] else None,
+        memory_budget=memory_budget
+    )
+    encoded.cache = TallyCache(min(TALLY_CACHE_BYTES, memory_budget))
+    return encoded
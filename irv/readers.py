@@ -0,0 +1,225 @@
+"""
+Readers for standard ranked-ballot formats.
+
+Both readers stream the file once, deduplicating identical ballot lines as they go, and encode straight
+into `EncodedBallots`, so no `list[list[str]]` of every ballot is ever built.
+
+    ballots = load_ballots("election.blt")
+    winner, steps = IRVElection(ballots).run()
+"""
+import array
+import csv
+import os
+from typing import Iterable, Iterator, TextIO, Union
+
+import numpy as np
+
+from .ballots import RankedChoiceBallots
+from .engine import EXHAUSTED, EncodedBallots, code_dtype
+
+COMMENT = "#"
+
+
+def _open(file: Union[str, TextIO]) -> TextIO:
+    return open(file, newline="") if isinstance(file, str) else file
+
+
+def _split_ballot(line: str) -> list[str]:
+    """Candidate names on one CSV ballot line, ignoring surrounding whitespace and empty fields"""
+    fields = next(csv.reader([line], skipinitialspace=True)) if '"' in line else line.split(",")
+    return [name for name in (field.strip() for field in fields) if name]
+
+
+def _encode_rows(rows: list[list[str]], inverse: np.ndarray, weights: np.ndarray,
+                 candidates: Iterable[str] = ()) -> EncodedBallots:
+    """Encodes unique ballots, given as names, with sorted candidate codes"""
+    names = sorted(set(candidates).union(*rows))
+    index = {name: code for code, name in enumerate(names)}
+    width = max(map(len, rows), default=0)
+    ranks = np.full((len(rows), max(width, 1)), EXHAUSTED, dtype=code_dtype(len(names)))
+    for row, ballot in enumerate(rows):
+        ranks[row, :len(ballot)] = [index[name] for name in ballot]
+    # nothing else holds these, so freezing them saves a copy
+    ranks.flags.writeable = weights.flags.writeable = False
+    return EncodedBallots(names, ranks, weights, inverse)
+
+
+def read_csv(file: Union[str, TextIO]) -> EncodedBallots:
+    """
+    Reads a CSV file with one ballot per line, ranking candidates from left to right.
+
+    Lines starting with `#` are comments and ignored. Blank lines are empty ballots.
+    Fields may be quoted, e.g. to include commas in candidate names. See `IRVElection` for an example.
+
+    Parameters
+    ----------
+    file : str or file-like
+        Filepath, or text file opened with `newline=""`
+
+    Returns
+    -------
+    ballots : EncodedBallots
+        Encoded ballots, in file order
+    """
+    unique: dict[str, int] = {}
+    inverse = array.array("q")
+    handle = _open(file)
+    try:
+        for line in handle:
+            line = line.strip()
+            if line.startswith(COMMENT):
+                continue
+            inverse.append(unique.setdefault(line, len(unique)))
+    finally:
+        if handle is not file:
+            handle.close()
+
+    rows = [_split_ballot(line) for line in unique]
+    inverse = np.frombuffer(inverse, dtype=np.int64) if inverse else np.empty(0, dtype=np.int64)
+    weights = np.bincount(inverse, minlength=len(rows)).astype(np.int64)
+    return _encode_rows(rows, inverse, weights)
+
+
+def read_blt(file: Union[str, TextIO]) -> EncodedBallots:
+    """
+    Reads a ballot file in the BLT format used by OpenSTV, ERS and most STV counting software.
+
+    The format is a header line with the number of candidates and seats, optional withdrawn candidates as
+    negative numbers, one line per ballot of `weight pref1 pref2 ... 0`, a line containing `0`, then one
+    quoted name per candidate and finally the quoted election title:
+
+        3 1
+        -2
+        4 1 2 0
+        2 3 0
+        0
+        "Alice"
+        "Bob"
+        "Carol"
+        "Mayor"
+
+    Withdrawn candidates are left off every ballot. `#` starts a comment anywhere in a line.
+
+    Parameters
+    ----------
+    file : str or file-like
+        Filepath, or text file
+
+    Returns
+    -------
+    ballots : EncodedBallots
+        Encoded ballots, with each weighted line expanded to `weight` ballots in `inverse`
+
+    Raises
+    ------
+    ValueError
+        If the file is malformed, elects more than one seat, or uses equal rankings or fractional weights
+    """
+    handle = _open(file)
+    try:
+        lines = (line.split(COMMENT, 1)[0].strip() for line in handle)
+        lines = (line for line in lines if line)
+        num_candidates, withdrawn, line = _read_blt_header(lines)
+        unique, weights = _read_blt_ballots(lines, line)
+        names = _read_blt_names(lines, num_candidates)
+    finally:
+        if handle is not file:
+            handle.close()
+
+    rows = [_blt_ranking(preferences, names, withdrawn) for preferences in unique]
+    weights = np.frombuffer(weights, dtype=np.int64) if weights else np.empty(0, dtype=np.int64)
+    inverse = np.repeat(np.arange(len(rows)), weights)
+    standing = [name for code, name in enumerate(names, 1) if code not in withdrawn]
+    return _encode_rows(rows, inverse, weights, standing)
+
+
+def _read_blt_header(lines: Iterator[str]) -> tuple[int, set[int], str]:
+    """
+    Helper for `read_blt`. Reads the header and withdrawn candidates.
+
+    Returns
+    -------
+    num_candidates : int
+    withdrawn : set[int]
+        Numbers of withdrawn candidates
+    line : str
+        First ballot line
+    """
+    try:
+        num_candidates, seats = map(int, next(lines).split())
+    except (StopIteration, ValueError):
+        raise ValueError("BLT file must start with the number of candidates and seats!")
+    if seats != 1:
+        raise ValueError(f"IRV elects a single winner, but the BLT file has {seats} seats!")
+
+    line = next(lines, "0")
+    if not line.startswith("-"):
+        return num_candidates, set(), line
+    return num_candidates, {-int(code) for code in line.split()}, next(lines, "0")
+
+
+def _read_blt_ballots(lines: Iterator[str], line: str) -> tuple[dict[str, int], array.array]:
+    """
+    Helper for `read_blt`. Reads ballot lines from `line` up to the end of ballots marker.
+
+    Returns
+    -------
+    unique : dict[str, int]
+        Maps the preferences of each distinct ballot line to its row
+    weights : array.array
+        Total weight of each row
+    """
+    unique: dict[str, int] = {}
+    weights = array.array("q")
+    while line != "0":
+        weight, _, preferences = line.partition(" ")
+        if not weight.isdigit():
+            raise ValueError(f"BLT ballot weights must be whole numbers, got {line!r}")
+        preferences = preferences.strip()
+        if not (preferences == "0" or preferences.endswith(" 0")):
+            raise ValueError(f"BLT ballot line must end with 0, got {line!r}")
+        row = unique.setdefault(preferences, len(unique))
+        if row == len(weights):
+            weights.append(0)
+        weights[row] += int(weight)
+        line = next(lines, None)
+        if line is None:
+            raise ValueError("BLT file ended before the end of ballots marker 0!")
+    return unique, weights
+
+
+def _read_blt_names(lines: Iterator[str], num_candidates: int) -> list[str]:
+    """Helper for `read_blt`. Reads the quoted candidate names. The election title after them is ignored."""
+    names = [next(lines, "").strip('"') for _ in range(num_candidates)]
+    if not all(names):
+        raise ValueError(f"BLT file must name all {num_candidates} candidates!")
+    return names
+
+
+def _blt_ranking(preferences: str, names: list[str], withdrawn: set[int]) -> list[str]:
+    """Helper for `read_blt`. Names ranked by one ballot line's `preferences`, without withdrawn candidates."""
+    codes = preferences.split()[:-1]
+    if any(not code.isdigit() for code in codes):
+        raise ValueError(f"BLT preferences must be candidate numbers without equal rankings, got {preferences!r}")
+    if any(not 1 <= int(code) <= len(names) for code in codes):
+        raise ValueError(f"BLT preferences must be between 1 and {len(names)}, got {preferences!r}")
+    return [names[int(code) - 1] for code in codes if int(code) not in withdrawn]
+
+
+def load_ballots(filepath: str) -> RankedChoiceBallots:
+    """
+    Reads ballots for `IRVElection`, with `read_blt` for `.blt` files and `read_csv` for anything else.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the ballot file
+
+    Returns
+    -------
+    ballots : RankedChoiceBallots
+        Validated ballots
+    """
+    if os.path.splitext(filepath)[1].lower() == ".blt":
+        return RankedChoiceBallots(encoded=read_blt(filepath))
+    return RankedChoiceBallots(encoded=read_csv(filepath))
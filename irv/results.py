@@ -0,0 +1,205 @@
+"""
+Bulk results writer for batch runs.
+
+Instead of one text file per question, every election's winner and round tallies are appended to a single
+JSON Lines, CSV or Parquet file as results come in:
+
+    with ResultsWriter("results.csv") as writer:
+        for result in run_batch(sources):
+            writer.write(result.record())
+
+The human readable report of any record can still be produced with `render_text`.
+"""
+import csv
+import json
+import os
+from typing import Optional
+
+from .constants import NO_CONFIDENCE, UNBREAKABLE_TIE_WINNER
+
+RESULTS_FORMATS = ("jsonl", "csv", "parquet")
+COLUMNS = ("org", "question", "winner", "num_ballots", "round", "candidate", "votes")
+"""Columns of the CSV and Parquet formats, which have one row per candidate per round"""
+
+
+def format_results(winner: str, steps: list[dict], num_ballots: int) -> str:
+    """
+    Formats the human readable report of an election, see `IRVElection.results_string`.
+
+    Parameters
+    ----------
+    winner : str
+        Winner of the election
+    steps : list[dict]
+        Candidate tallies at each round
+    num_ballots : int
+        Number of ballots cast
+    """
+    winner_line = f'= WINNER: {winner} ='
+    lines = ['=' * len(winner_line),
+             winner_line,
+             '=' * len(winner_line),
+             f"There were {num_ballots} total ballots cast"]
+
+    if winner not in [NO_CONFIDENCE, UNBREAKABLE_TIE_WINNER]:
+        percent_votes = round(100*steps[-1][winner]/num_ballots, 2)
+        lines.append(f"In the final round, {winner} received {steps[-1][winner]} votes, or {percent_votes}%")
+    lines.append('\n')
+    lines.append('==========')
+    lines.append('= ROUNDS =')
+    lines.append('==========')
+    # TODO: sort steps, do nothing, or keep order consistent?
+    for i in range(len(steps)):
+        lines.append(f'Round {i+1}: {steps[i]}')
+    return "\n".join(lines)
+
+
+def render_text(record: dict) -> str:
+    """Human readable report of an `election_record`"""
+    return format_results(record["winner"], record["steps"], record["num_ballots"])
+
+
+def record_rows(record: dict) -> list[tuple]:
+    """Flattens an `election_record` to one row of `COLUMNS` per candidate per round"""
+    head = (record.get("org", ""), record["question"], record["winner"], record["num_ballots"])
+    return [
+        head + (i, candidate, votes)
+        for i, step in enumerate(record["steps"], 1)
+        for candidate, votes in step.items()
+    ]
+
+
+def format_from_extension(filepath: str) -> str:
+    """Results format from the file extension, `.jsonl` (or `.json`), `.csv` or `.parquet`"""
+    extension = os.path.splitext(filepath)[1].lower().lstrip(".")
+    extension = {"json": "jsonl", "ndjson": "jsonl", "pq": "parquet"}.get(extension, extension)
+    if extension not in RESULTS_FORMATS:
+        raise ValueError(f"Unknown results format {extension!r}, must be one of {RESULTS_FORMATS}")
+    return extension
+
+
+class ResultsWriter:
+    """
+    Appends election records to one JSON Lines, CSV or Parquet file.
+
+    JSON Lines holds one `election_record` per line. CSV and Parquet hold the flattened rows of
+    `record_rows`, which load straight into a DataFrame. JSON Lines and CSV rows are written as soon as
+    each record arrives. Parquet needs `pyarrow`, and buffers `row_group_size` records per row group.
+
+    Use as a context manager, or call `close` when done.
+
+    Parameters
+    ----------
+    filepath : str
+        File to write. Existing files are overwritten.
+    results_format : str, optional
+        One of "jsonl", "csv" and "parquet". Default: from the extension of `filepath`
+    row_group_size : int, optional
+        Records per Parquet row group. Default: 1000
+    """
+    def __init__(self, filepath: str, results_format: Optional[str] = None, row_group_size: int = 1000):
+        self.filepath: str = filepath
+        self.results_format: str = results_format or format_from_extension(filepath)
+        if self.results_format not in RESULTS_FORMATS:
+            raise ValueError(f"Unknown results format {self.results_format!r}, must be one of {RESULTS_FORMATS}")
+        self.row_group_size: int = row_group_size
+        self.num_records: int = 0
+        self._pending: list[tuple] = []
+        self._parquet_writer = None
+
+        if self.results_format == "parquet":
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError("Writing Parquet results needs pyarrow: pip install pyarrow")
+            schema = pyarrow.schema([
+                ("org", pyarrow.string()), ("question", pyarrow.string()), ("winner", pyarrow.string()),
+                ("num_ballots", pyarrow.int64()), ("round", pyarrow.int32()), ("candidate", pyarrow.string()),
+                ("votes", pyarrow.int64()),
+            ])
+            self._parquet_writer = pyarrow.parquet.ParquetWriter(filepath, schema)
+            self._file = None
+        else:
+            self._file = open(filepath, "w", newline="")
+            if self.results_format == "csv":
+                self._csv = csv.writer(self._file)
+                self._csv.writerow(COLUMNS)
+
+    def write(self, record: dict) -> None:
+        """Appends one `election_record`, optionally with an "org" key"""
+        self.num_records += 1
+        if self.results_format == "jsonl":
+            self._file.write(json.dumps(record))
+            self._file.write("\n")
+        elif self.results_format == "csv":
+            self._csv.writerows(record_rows(record))
+        else:
+            self._pending.extend(record_rows(record))
+            if self.num_records % self.row_group_size == 0:
+                self._flush_row_group()
+
+    def _flush_row_group(self) -> None:
+        import pyarrow
+        if not self._pending:
+            return
+        columns = list(zip(*self._pending))
+        table = pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, self._parquet_writer.schema)],
+            schema=self._parquet_writer.schema
+        )
+        self._parquet_writer.write_table(table)
+        self._pending = []
+
+    def close(self) -> None:
+        """Writes anything buffered and closes the file"""
+        if self._parquet_writer is not None:
+            self._flush_row_group()
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        elif not self._file.closed:
+            self._file.close()
+
+    def __enter__(self) -> "ResultsWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def read_results(filepath: str) -> list[dict]:
+    """
+    Reads election records written by `ResultsWriter` back, so they can be rendered with `render_text`.
+
+    Parameters
+    ----------
+    filepath : str
+        JSON Lines, CSV or Parquet results file
+
+    Returns
+    -------
+    records : list[dict]
+        Records in file order. Records read from CSV or Parquet have no "spoilt_ballots",
+        and elections without any rounds are missing from them.
+    """
+    file_format = format_from_extension(filepath)
+    if file_format == "jsonl":
+        with open(filepath) as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+    import pandas as pd
+    if file_format == "csv":
+        text = {column: str for column in ("org", "question", "winner", "candidate")}
+        df = pd.read_csv(filepath, dtype=text, keep_default_na=False)
+    else:
+        df = pd.read_parquet(filepath)
+    records = []
+    for (org, question), rows in df.groupby(["org", "question"], sort=False):
+        steps = [dict(zip(step["candidate"], step["votes"].astype(int).tolist()))
+                 for _, step in rows.groupby("round", sort=True)]
+        record = {"question": question, "winner": rows["winner"].iloc[0],
+                  "num_ballots": int(rows["num_ballots"].iloc[0]), "steps": steps}
+        if org:
+            record["org"] = org
+        records.append(record)
+    return records
@@ -0,0 +1,214 @@
+"""
+Local HTTP tabulation service.
+
+In the case that the website breaks, or for a stand-in website, this serves tabulations over HTTP
+without paying the import and process-spawn cost of shelling out to `irv` on every request.
+A pool of worker processes, with pandas and NumPy already imported, parses each upload once and then runs
+its questions in parallel, as well as separate uploads. Results are cached by content hash.
+
+    $ irv-service --port 8080
+    $ curl --data-binary @wc.csv -H "Content-Type: text/csv" localhost:8080/tabulate
+
+Endpoints
+---------
+GET /health
+    Returns {"status": "ok", "workers": <number of worker processes>}
+POST /tabulate
+    Body is a Wildcat Connection export (any content type), or encoded ballots saved with
+    `irv.engine.save_encoded` (`Content-Type: application/x-npz`, or detected from the zip header).
+    Query parameters: `remove_exhausted_ballots=1`, `duplicate_policy=<policy>`.
+    Returns {"sha256": ..., "cached": bool, "results": [<election record>, ...]},
+    see `irv.tabulation.election_record`.
+    Uploads that can't be parsed get status 400, and any other failure status 500, with {"error": ...}.
+"""
+import argparse
+import collections
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from wildcat_connection.utils import ParsingException
+from .tabulation import parse_upload, tabulate_question
+
+NPZ_CONTENT_TYPE = "application/x-npz"
+ZIP_MAGIC = b"PK\x03\x04"
+
+
+def _warm_worker() -> None:
+    """Process pool initializer: import everything up front so requests don't pay for it"""
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    import wildcat_connection  # noqa: F401
+
+
+class TabulationService:
+    """
+    Tabulates uploads on a warm worker pool and caches results by content hash.
+
+    Independent of HTTP, so it can be reused or tested directly; see `make_server` for the HTTP front end.
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        Number of worker processes. Default: CPU count
+    cache_size : int, optional
+        Number of results to keep, least recently used are evicted first. Default: 256
+    executor : Executor, optional
+        Executor to run tasks on instead of a new process pool. It is not shut down by `close`.
+    """
+    def __init__(self, max_workers: Optional[int] = None, cache_size: int = 256, executor: Optional[Executor] = None):
+        self.max_workers: int = max_workers or os.cpu_count() or 1
+        self.cache_size: int = cache_size
+        self._owns_executor: bool = executor is None
+        self.executor: Executor = executor or ProcessPoolExecutor(self.max_workers, initializer=_warm_worker)
+        self._cache: collections.OrderedDict = collections.OrderedDict()
+        self._lock = threading.Lock()
+        if self._owns_executor:
+            # start every worker now rather than on the first requests
+            for future in [self.executor.submit(_warm_worker) for _ in range(self.max_workers)]:
+                future.result()
+
+    @staticmethod
+    def cache_key(data: bytes, options: dict) -> str:
+        """SHA-256 of the upload and the options that affect its result"""
+        digest = hashlib.sha256(data)
+        digest.update(json.dumps(options, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def tabulate(self, data: bytes, encoded: bool = False, remove_exhausted_ballots: bool = False,
+                 duplicate_policy: str = "error") -> dict:
+        """
+        Tabulates every question of an upload. The upload is parsed on one worker, and its questions
+        are then counted on every worker at once.
+
+        Parameters
+        ----------
+        data : bytes
+            Wildcat Connection export, or `save_encoded` output if `encoded`
+        encoded : bool, optional
+            Whether `data` holds encoded ballots. Default: False
+        remove_exhausted_ballots : bool, optional
+            See `IRVElection`. Default: False
+        duplicate_policy : str, optional
+            See `WildcatConnectionCSV`. Default: "error"
+
+        Returns
+        -------
+        response : dict
+            Dictionary with keys "sha256", "cached" and "results"
+
+        Raises
+        ------
+        ParsingException
+            If `data` can't be parsed
+        """
+        # the same bytes read as another format are another upload
+        options = {"encoded": encoded, "remove_exhausted_ballots": remove_exhausted_ballots,
+                   "duplicate_policy": duplicate_policy}
+        key = self.cache_key(data, options)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return {"sha256": key, "cached": True, "results": self._cache[key]}
+
+        question_ballots, spoilt_ballots = self.executor.submit(parse_upload, data, encoded, duplicate_policy).result()
+        futures = [self.executor.submit(tabulate_question, question, ballots, remove_exhausted_ballots,
+                                        spoilt_ballots.get(question))
+                   for question, ballots in question_ballots.items()]
+        results = [future.result() for future in futures]
+
+        with self._lock:
+            self._cache[key] = results
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return {"sha256": key, "cached": False, "results": results}
+
+    def close(self) -> None:
+        """Shuts down the worker pool, if this service created it"""
+        if self._owns_executor:
+            self.executor.shutdown()
+
+
+class _TabulationHandler(BaseHTTPRequestHandler):
+    """HTTP front end for `TabulationService`, see the module docstring for endpoints"""
+    service: TabulationService = None
+
+    def _send_json(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self) -> None:
+        if urlparse(self.path).path == "/health":
+            self._send_json(200, {"status": "ok", "workers": self.service.max_workers})
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        if url.path != "/tabulate":
+            self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+            return
+        query = parse_qs(url.query)
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        encoded = self.headers.get("Content-Type", "") == NPZ_CONTENT_TYPE or data.startswith(ZIP_MAGIC)
+        try:
+            response = self.service.tabulate(
+                data,
+                encoded=encoded,
+                remove_exhausted_ballots=query.get("remove_exhausted_ballots", ["0"])[0].lower() in ("1", "true"),
+                duplicate_policy=query.get("duplicate_policy", ["error"])[0],
+            )
+        except ParsingException as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._send_json(200, response)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def make_server(service: TabulationService, host: str = "127.0.0.1", port: int = 8080) -> ThreadingHTTPServer:
+    """
+    Creates a threaded HTTP server for `service`. Call `serve_forever` to start it.
+
+    Each request is handled on its own thread, and the heavy work happens on the service's worker pool,
+    so concurrent requests run in parallel.
+    """
+    handler = type("TabulationHandler", (_TabulationHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve IRV tabulations over HTTP.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to bind to.")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes. Default: CPU count.")
+    parser.add_argument("--cache_size", type=int, default=256, help="Number of cached results.")
+    args = parser.parse_args(argv)
+
+    service = TabulationService(args.workers, args.cache_size)
+    server = make_server(service, args.host, args.port)
+    print(f"Serving tabulations on http://{args.host}:{server.server_address[1]} with {service.max_workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import csv
+import numpy as np
+
+from wildcat_connection.constants import SUBMISSION_ID_COLNAME, QUESTION_RANK_SEPARATOR
+from .ballots import RankedChoiceBallots
+
+
+def candidate_names(num_candidates: int) -> list[str]:
+    """Gets the candidate names used by synthetic elections"""
+    return [f"Candidate {i + 1}" for i in range(num_candidates)]
+
+
+def generate_votes(num_ballots: int,
+                   num_candidates: int,
+                   seed: int = 0,
+                   exhaust_rate: float = 0.3) -> list[list[str]]:
+    """
+    Generates random ranked ballots for benchmarking and testing.
+
+    Candidates get Dirichlet distributed popularity, so elections take several rounds
+    instead of ending in a tie or a first round landslide.
+
+    Parameters
+    ----------
+    num_ballots : int
+        Number of ballots to generate
+    num_candidates : int
+        Number of candidates in the election
+    seed : int, optional
+        Seed for the random generator. Default: 0
+    exhaust_rate : float, optional
+        Probability that a ballot stops ranking candidates after each choice. Default: 0.3
+
+    Returns
+    -------
+    votes : list[list[str]]
+        2D list of votes, in the format of `RankedChoiceBallots.votes`
+    """
+    rng = np.random.default_rng(seed)
+    names = candidate_names(num_candidates)
+    popularity = rng.dirichlet(np.ones(num_candidates))
+    # Gumbel trick: sorting log-popularity plus Gumbel noise samples rankings without replacement
+    keys = np.log(popularity) + rng.gumbel(size=(num_ballots, num_candidates))
+    rankings = np.argsort(-keys, axis=1)
+    lengths = np.minimum(rng.geometric(exhaust_rate, size=num_ballots), num_candidates) \
+        if exhaust_rate > 0 else np.full(num_ballots, num_candidates)
+    return [[names[c] for c in rankings[i, :lengths[i]]] for i in range(num_ballots)]
+
+
+def generate_ballots(num_ballots: int, num_candidates: int, seed: int = 0,
+                     exhaust_rate: float = 0.3) -> RankedChoiceBallots:
+    """Generates random `RankedChoiceBallots`. See `generate_votes` for parameters."""
+    return RankedChoiceBallots(generate_votes(num_ballots, num_candidates, seed, exhaust_rate))
+
+
+def write_wc_csv(filepath: str,
+                 num_submissions: int,
+                 question_num_candidates: dict[str, int],
+                 seed: int = 0,
+                 spoil_rate: float = 0.01,
+                 first_submission_id: int = 1000000) -> None:
+    """
+    Writes a synthetic Wildcat Connection export.
+
+    Parameters
+    ----------
+    filepath : str
+        Where to write the CSV
+    num_submissions : int
+        Number of submissions (rows)
+    question_num_candidates : dict[str, int]
+        Maps question name to number of candidates
+    seed : int, optional
+        Seed for the random generator. Default: 0
+    spoil_rate : float, optional
+        Fraction of ballots per question with a gap in the ranks. Default: 0.01
+    first_submission_id : int, optional
+        SubmissionId of the first row, the following rows count up from it. Default: 1000000
+    """
+    rng = np.random.default_rng(seed)
+    header = [SUBMISSION_ID_COLNAME]
+    columns = []
+    for q, (question, num_candidates) in enumerate(question_num_candidates.items()):
+        header += [f"{question}{QUESTION_RANK_SEPARATOR}{rank}" for rank in range(1, num_candidates + 1)]
+        votes = generate_votes(num_submissions, num_candidates, seed=seed + q)
+        for ballot in votes:
+            spoil = len(ballot) > 1 and rng.random() < spoil_rate
+            ballot += [""] * (num_candidates - len(ballot))
+            if spoil:
+                ballot[0] = ""
+        columns.append(votes)
+
+    with open(filepath, "w", newline="") as file:
+        file.write("Synthetic Election\n\n")
+        writer = csv.writer(file, quoting=csv.QUOTE_ALL)
+        writer.writerow(header)
+        for i in range(num_submissions):
+            row = [str(first_submission_id + i)]
+            for votes in columns:
+                row += votes[i]
+            writer.writerow(row)
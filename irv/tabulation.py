@@ -0,0 +1,130 @@
+import io
+from typing import Optional, Union
+
+from .ballots import RankedChoiceBallots
+from .engine import EncodedBallots, load_encoded
+from .irv import IRVElection
+
+
+def election_record(question: str,
+                    winner: str,
+                    steps: list[dict],
+                    num_ballots: int,
+                    spoilt_ballots: Optional[list[int]] = None) -> dict:
+    """
+    Converts an election outcome to a JSON serializable record.
+
+    Parameters
+    ----------
+    question : str
+        Question (election) name
+    winner : str
+        Winner, as returned by `IRVElection.run`
+    steps : list[dict]
+        Round tallies, as returned by `IRVElection.run`
+    num_ballots : int
+        Number of ballots counted
+    spoilt_ballots : list[int], optional
+        SubmissionIDs of spoilt ballots
+
+    Returns
+    -------
+    record : dict
+        Dictionary with keys "question", "winner", "num_ballots", "steps" and "spoilt_ballots"
+    """
+    return {
+        "question": question,
+        "winner": winner,
+        "num_ballots": int(num_ballots),
+        "steps": [{name: int(tally) for name, tally in step.items()} for step in steps],
+        "spoilt_ballots": [int(submission_id) for submission_id in spoilt_ballots or []],
+    }
+
+
+def tabulate_question(question: str,
+                      ballots: Union[RankedChoiceBallots, EncodedBallots],
+                      remove_exhausted_ballots: bool = False,
+                      spoilt_ballots: Optional[list[int]] = None) -> dict:
+    """
+    Runs the IRV election of one question, and returns its `election_record`.
+
+    Parameters
+    ----------
+    question : str
+        Question name
+    ballots : RankedChoiceBallots or EncodedBallots
+        Ballots cast
+    remove_exhausted_ballots : bool, optional
+        See `IRVElection`. Default: False
+    spoilt_ballots : list[int], optional
+        Passed through to the record
+    """
+    if isinstance(ballots, EncodedBallots):
+        ballots = RankedChoiceBallots(encoded=ballots)
+    election = IRVElection(ballots, remove_exhausted_ballots=remove_exhausted_ballots, name=question)
+    winner, steps = election.run()
+    return election_record(question, winner, steps, len(ballots), spoilt_ballots)
+
+
+def parse_export(data: Union[bytes, list[bytes]],
+                 duplicate_policy: str = "error") -> tuple[dict[str, EncodedBallots], dict[str, list[int]]]:
+    """
+    Parses Wildcat Connection export(s) held in memory. Runs in worker processes, so it is module level.
+
+    Parameters
+    ----------
+    data : bytes or list[bytes]
+        Contents of one export, or of several exports to merge
+    duplicate_policy : str, optional
+        See `WildcatConnectionCSV`. Default: "error"
+
+    Returns
+    -------
+    question_ballots : dict[str, EncodedBallots]
+        Maps question name to its encoded ballots
+    question_spoilt_ballots : dict[str, list[int]]
+        Maps question name to SubmissionIDs of spoilt ballots
+    """
+    from wildcat_connection import WildcatConnectionCSV
+    buffers = [io.BytesIO(data)] if isinstance(data, bytes) else [io.BytesIO(export) for export in data]
+    wc_csv = WildcatConnectionCSV(buffers, duplicate_policy=duplicate_policy)
+    encoded = {question: ballots.encoded for question, ballots in wc_csv.question_formatted_ballots.items()}
+    return encoded, wc_csv.question_spoilt_ballots
+
+
+def parse_upload(data: bytes,
+                 encoded: bool = False,
+                 duplicate_policy: str = "error") -> tuple[dict[str, EncodedBallots], dict[str, list[int]]]:
+    """
+    Parses an upload to the tabulation service. Runs in worker processes, so it is module level.
+
+    Parameters
+    ----------
+    data : bytes
+        Wildcat Connection export, or `save_encoded` output if `encoded`
+    encoded : bool, optional
+        Whether `data` holds encoded ballots. Default: False
+    duplicate_policy : str, optional
+        See `WildcatConnectionCSV`. Default: "error"
+
+    Returns
+    -------
+    question_ballots, question_spoilt_ballots :
+        See `parse_export`. Encoded ballots have no spoilt ballots.
+
+    Raises
+    ------
+    ParsingException
+        If `data` can't be parsed, or `duplicate_policy` is invalid
+    """
+    from wildcat_connection.utils import ParsingException
+    if encoded:
+        try:
+            return load_encoded(io.BytesIO(data)), {}
+        except Exception as e:
+            raise ParsingException(f"Could not read encoded ballots: {e}") from e
+    try:
+        return parse_export(data, duplicate_policy)
+    except ValueError as e:
+        # a bad duplicate_policy, or SubmissionId collisions, are the uploader's to fix too
+        raise ParsingException(str(e)) from e
@@ -0,0 +1,172 @@
+"""
+Exhaustive analysis of unbreakable ties.
+
+When `IRVElection.break_ties` can't separate the candidates tied for last, the count stops with
+`UNBREAKABLE_TIE_WINNER`. Often the tie doesn't matter: whichever tied candidate goes first, the same
+candidate wins in the end. `analyze_ties` finds out by following every elimination at every unbreakable
+tie to the end of the count:
+
+    analysis = analyze_ties(election)
+    if analysis.decisive:
+        print(f"Every way of breaking the tie elects {analysis.winner}, no new election is needed")
+
+Counts only depend on the set of candidates still standing, so each set is counted once however many
+branches reach it. Sets are explored level by level, and each level is counted on a thread pool.
+"""
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+from .constants import MAX_TIE_STATES, NO_CONFIDENCE
+from .irv import IRVElection
+
+
+class TieAnalysis(NamedTuple):
+    """
+    Outcome of `analyze_ties`.
+
+    Attributes
+    ----------
+    winners : dict[str, int]
+        Maps each possible winner (or "No Confidence") to the number of ways of breaking the unbreakable
+        ties that elect them. Empty if the search was cut short.
+    ties : dict[frozenset, list[str]]
+        Candidates left tied, sorted, at each set of standing candidates where the tie was unbreakable
+    states : int
+        Number of distinct sets of standing candidates counted
+    complete : bool
+        False if the search stopped at the branch budget, so `winners` is unknown
+    """
+    winners: dict
+    ties: dict
+    states: int
+    complete: bool
+
+    @property
+    def decisive(self) -> bool:
+        """Whether every way of breaking the ties elects the same winner, so the ties don't matter"""
+        return self.complete and len(self.winners) == 1
+
+    @property
+    def winner(self) -> Optional[str]:
+        """The winner on every branch if `decisive`, else None"""
+        return next(iter(self.winners)) if self.decisive else None
+
+    def summary(self) -> str:
+        """One line description, for results reports"""
+        if not self.complete:
+            return f"Tie analysis stopped after {self.states} candidate sets, the outcome of the tie is unknown"
+        if not self.ties:
+            return "Tie analysis found no unbreakable ties"
+        if self.decisive:
+            return f"Every way of breaking the tie elects {self.winner}, no new election is needed"
+        outcomes = ", ".join(f"{name} ({ways})" for name, ways in sorted(self.winners.items()))
+        return f"The tie decides the election, ways of breaking it that elect each winner: {outcomes}"
+
+
+def _next_step(election: IRVElection, active: frozenset, cached: bool) -> tuple[str, object]:
+    """
+    Helper for `analyze_ties`. What the count does with `active` candidates standing, following `IRVElection.run`.
+
+    Returns
+    -------
+    step : tuple[str, object]
+        ("winner", name) once the count ends, ("eliminate", losers) for the losers of a round,
+        or ("tie", tied candidates) at an unbreakable tie
+    """
+    num_ballots = len(election.ballots)
+    if not active:
+        return "winner", NO_CONFIDENCE
+
+    encoded = election.ballots.encoded
+    mask = encoded.active_mask(active)
+    # the shared tally cache isn't thread safe, so worker threads count directly
+    counts = encoded.count(mask, cached)[1]
+    tallies = collections.Counter({name: int(counts[encoded.index[name]]) for name in sorted(active)})
+
+    if len(tallies) == 1:
+        (winner, votes), = tallies.items()
+        if not election.remove_exhausted_ballots and votes / num_ballots <= 0.5:
+            winner = NO_CONFIDENCE
+        return "winner", winner
+
+    sort_tallies = tallies.most_common()[::-1]
+    if sort_tallies[-1][1] > num_ballots / 2:
+        return "winner", sort_tallies[-1][0]
+    min_names = [name for name, votes in sort_tallies if votes == sort_tallies[0][1]]
+    if len(min_names) == 1:
+        return "eliminate", min_names
+    losers, still_tied = election.refine_tie(min_names, tallies)
+    if losers:
+        return "eliminate", losers
+    return "tie", still_tied
+
+
+def analyze_ties(election: IRVElection,
+                 max_states: int = MAX_TIE_STATES,
+                 workers: Optional[int] = None) -> TieAnalysis:
+    """
+    Follows the count down every branch of every unbreakable tie, eliminating each tied candidate in turn.
+
+    Parameters
+    ----------
+    election : IRVElection
+        Election to analyze. It doesn't need to have been run.
+    max_states : int, optional
+        Branch budget: most distinct sets of standing candidates to count. Default: `MAX_TIE_STATES`
+    workers : int, optional
+        Threads counting each level of the search. 1 counts on the calling thread, sharing the ballots'
+        tally cache with `election.run`. Default: `ThreadPoolExecutor`'s default
+
+    Returns
+    -------
+    analysis : TieAnalysis
+    """
+    steps: dict[frozenset, tuple[str, object]] = {}
+    frontier = [frozenset(election.candidates)]
+    executor = ThreadPoolExecutor(workers) if workers != 1 else None
+    try:
+        while frontier:
+            if len(steps) + len(frontier) > max_states:
+                return TieAnalysis({}, _ties(steps), len(steps), False)
+            if executor is None or len(frontier) == 1:
+                found = [_next_step(election, active, executor is None) for active in frontier]
+            else:
+                found = list(executor.map(lambda active: _next_step(election, active, False), frontier))
+            steps.update(zip(frontier, found))
+            frontier = [active for active in _children(frontier, found) if active not in steps]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return TieAnalysis(_winners(steps, frozenset(election.candidates)), _ties(steps), len(steps), True)
+
+
+def _children(frontier: list[frozenset], found: list[tuple[str, object]]) -> set[frozenset]:
+    """Helper for `analyze_ties`. Sets of standing candidates the steps `found` at `frontier` lead to."""
+    children = set()
+    for active, (kind, value) in zip(frontier, found):
+        if kind == "eliminate":
+            children.add(active - set(value))
+        elif kind == "tie":
+            children.update(active - {name} for name in value)
+    return children
+
+
+def _winners(steps: dict[frozenset, tuple[str, object]], candidates: frozenset) -> dict[str, int]:
+    """Helper for `analyze_ties`. Number of ways of breaking the ties that elect each winner, from a complete search."""
+    winners: dict[frozenset, collections.Counter] = {}
+    # every child has fewer candidates than its parent, so count up from the smallest sets
+    for active in sorted(steps, key=len):
+        kind, value = steps[active]
+        if kind == "winner":
+            winners[active] = collections.Counter({value: 1})
+        elif kind == "eliminate":
+            winners[active] = winners[active - set(value)]
+        else:
+            winners[active] = sum((winners[active - {name}] for name in value), collections.Counter())
+    return dict(winners[candidates])
+
+
+def _ties(steps: dict[frozenset, tuple[str, object]]) -> dict[frozenset, list[str]]:
+    """Helper for `analyze_ties`. Tied candidates of every unbreakable tie found."""
+    return {active: sorted(value) for active, (kind, value) in steps.items() if kind == "tie"}
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Callable, Optional
+
+from wildcat_connection import WildcatConnectionCSV
+from .constants import MAX_TIE_STATES
+from .irv import IRVElection
+
+WATCH_CACHE_FILENAME = ".irv_watch_cache.json"
+
+_logger = logging.getLogger(__name__)
+
+
+def atomic_write(filepath: str, contents: str) -> None:
+    """Writes `contents` to a temporary file next to `filepath`, then renames it over `filepath`"""
+    folder = os.path.dirname(filepath) or "."
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".tmp-", suffix=os.path.basename(filepath))
+    try:
+        with os.fdopen(fd, "w") as file:
+            file.write(contents)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def file_sha256(filepath: str) -> str:
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FolderWatcher:
+    """
+    Polls a folder for new or changed Wildcat Connection exports, and tabulates each one that changed.
+
+    A file is only read once its size and modification time have stayed the same for `debounce` seconds,
+    so exports still being copied in are not tabulated half written. Files whose contents hash the same as
+    when they were last tabulated are skipped, so each refresh only costs the files that actually changed.
+    The content hashes, together with the options that change results, are saved in `elections_output`,
+    so restarting the watcher doesn't redo finished work, but changing an option does.
+
+    Results of `folder/<export>.csv` are written to `elections_output/<export>/<question>.txt`, and with
+    `transfers_output` also `<question>_transfers.csv` and `<question>_fates.txt`.
+    Every file is written atomically, so readers never see partial results.
+
+    Parameters
+    ----------
+    folder : str
+        Folder to watch. Only `.csv` files directly inside it are tabulated.
+    elections_output : str
+        Folder for saving elections output
+    interval : float, optional
+        Seconds between polls. Default: 2.0
+    debounce : float, optional
+        Seconds a file must stay unchanged before it is tabulated. Default: 2.0
+    remove_exhausted_ballots : bool, optional
+        See `IRVElection`. Default: False
+    analyze_ties : bool, optional
+        See `IRVElection`. Default: False
+    tie_branch_budget : int, optional
+        See `IRVElection`. Default: `MAX_TIE_STATES`
+    duplicate_policy : str, optional
+        See `WildcatConnectionCSV`. Default: "error"
+    spoil_policy : str, optional
+        See `WildcatConnectionCSV`. Default: "discard"
+    transfers_output : bool, optional
+        Whether to also save each round's vote transfers and each ballot's final destination. Default: False
+    on_result : Callable[[str, str, str, list[dict]], None], optional
+        Called with export filepath, question, winner and steps after each question is tabulated
+    """
+    def __init__(self,
+                 folder: str,
+                 elections_output: str,
+                 interval: float = 2.0,
+                 debounce: float = 2.0,
+                 remove_exhausted_ballots: bool = False,
+                 analyze_ties: bool = False,
+                 tie_branch_budget: int = MAX_TIE_STATES,
+                 duplicate_policy: str = "error",
+                 spoil_policy: str = "discard",
+                 transfers_output: bool = False,
+                 on_result: Optional[Callable[[str, str, str, list[dict]], None]] = None):
+        self.folder = folder
+        self.elections_output = elections_output
+        self.interval = interval
+        self.debounce = debounce
+        self.remove_exhausted_ballots = remove_exhausted_ballots
+        self.analyze_ties = analyze_ties
+        self.tie_branch_budget = tie_branch_budget
+        self.duplicate_policy = duplicate_policy
+        self.spoil_policy = spoil_policy
+        self.transfers_output = transfers_output
+        self.on_result = on_result
+        self._cache_path = os.path.join(elections_output, WATCH_CACHE_FILENAME)
+        self._hashes: dict[str, str] = self._load_cache()
+        self._pending: dict[str, tuple[tuple[int, int], float]] = {}
+        self._seen: dict[str, tuple[int, int]] = {}
+
+    def _load_cache(self) -> dict[str, str]:
+        try:
+            with open(self._cache_path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _stable_files(self) -> list[str]:
+        """Files that changed since the last poll that tabulated them, and have stopped changing"""
+        now = time.monotonic()
+        ready = []
+        for entry in sorted(os.scandir(self.folder), key=lambda e: e.name):
+            if not entry.is_file() or not entry.name.lower().endswith(".csv"):
+                continue
+            stat = entry.stat()
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if self._seen.get(entry.path) == signature:
+                continue
+            pending = self._pending.get(entry.path)
+            if pending is None or pending[0] != signature:
+                self._pending[entry.path] = (signature, now)
+                pending = self._pending[entry.path]
+            if now - pending[1] >= self.debounce:
+                del self._pending[entry.path]
+                self._seen[entry.path] = signature
+                ready.append(entry.path)
+        return ready
+
+    def tabulate(self, filepath: str) -> list[tuple[str, str, list[dict]]]:
+        """Tabulates every question of one export and writes the results"""
+        output = os.path.join(self.elections_output, os.path.splitext(os.path.basename(filepath))[0])
+        os.makedirs(output, exist_ok=True)
+        results = []
+        wc_csv = WildcatConnectionCSV(filepath, duplicate_policy=self.duplicate_policy, spoil_policy=self.spoil_policy)
+        for question, ballots in wc_csv.question_formatted_ballots.items():
+            # every option is passed, so none comes from the command line behind the cache's back
+            election = IRVElection(ballots, name=question, remove_exhausted_ballots=self.remove_exhausted_ballots,
+                                   analyze_ties=self.analyze_ties, tie_branch_budget=self.tie_branch_budget,
+                                   record_transfers=self.transfers_output)
+            winner, steps = election.run()
+            atomic_write(os.path.join(output, f"{question}.txt"), election.results_string(winner, steps))
+            if self.transfers_output:
+                self._write_transfers(election, os.path.join(output, question))
+            results.append((question, winner, steps))
+            if self.on_result is not None:
+                self.on_result(filepath, question, winner, steps)
+        return results
+
+    @staticmethod
+    def _write_transfers(election: IRVElection, prefix: str) -> None:
+        """Helper for `tabulate`. `IRVElection.write_transfers` to `<prefix>_transfers.csv` and `<prefix>_fates.txt`."""
+        paths = [f"{prefix}_transfers.csv", f"{prefix}_fates.txt"]
+        temp_paths = [os.path.join(os.path.dirname(path), f".tmp-{os.path.basename(path)}") for path in paths]
+        election.write_transfers(*temp_paths)
+        for temp_path, path in zip(temp_paths, paths):
+            os.replace(temp_path, path)
+
+    def _digest(self, filepath: str) -> str:
+        """Content hash of an export, combined with the options that change its results"""
+        options = [self.remove_exhausted_ballots, self.analyze_ties, self.tie_branch_budget, self.duplicate_policy,
+                   self.spoil_policy, self.transfers_output]
+        return hashlib.sha256((file_sha256(filepath) + json.dumps(options)).encode()).hexdigest()
+
+    def poll(self) -> dict[str, list[tuple[str, str, list[dict]]]]:
+        """
+        Checks the folder once, and tabulates every export that changed.
+
+        Returns
+        -------
+        results : dict[str, list[tuple[str, str, list[dict]]]]
+            Maps each tabulated export to its list of (question, winner, steps)
+        """
+        results = {}
+        for filepath in self._stable_files():
+            digest = self._digest(filepath)
+            if self._hashes.get(filepath) == digest:
+                continue
+            try:
+                results[filepath] = self.tabulate(filepath)
+            except Exception as e:
+                # leave it out of the cache, so it is retried when the file changes
+                _logger.error(f"Could not tabulate {filepath}: {e}")
+                continue
+            self._hashes[filepath] = digest
+
+        if results:
+            os.makedirs(self.elections_output, exist_ok=True)
+            atomic_write(self._cache_path, json.dumps(self._hashes, indent=2))
+        return results
+
+    def run(self, max_polls: Optional[int] = None) -> None:
+        """Polls every `interval` seconds until interrupted, or `max_polls` polls"""
+        polls = 0
+        while True:
+            self.poll()
+            polls += 1
+            if max_polls is not None and polls >= max_polls:
+                return
+            time.sleep(self.interval)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from irv import IRVElection
+from irv.audit import Assertion, BallotPollingAudit, irv_assertions
+from irv.ballots import RankedChoiceBallots
+from irv.constants import NO_CONFIDENCE
+from irv.synthetic import write_wc_csv
+from wildcat_connection import WildcatConnectionCSV
+
+VOTES = [["A", "B"]] * 60 + [["B", "A"]] * 25 + [["C", "B"]] * 15
+
+
+def _audit(votes=VOTES, **kwargs) -> BallotPollingAudit:
+    election = IRVElection(RankedChoiceBallots(votes))
+    winner, steps = election.run()
+    return BallotPollingAudit(election, winner, steps, **kwargs)
+
+
+def test_irv_assertions():
+    steps = [{"A": 40, "B": 35, "C": 25}, {"A": 50, "B": 45}]
+    assert irv_assertions("A", steps, 100) == [
+        Assertion("A", "C", frozenset("ABC")),
+        Assertion("B", "C", frozenset("ABC")),
+        Assertion("A", "B", frozenset("AB")),
+    ]
+    assert irv_assertions("A", steps[:1], 70)[-1] == Assertion("A", NO_CONFIDENCE, frozenset("ABC"))
+    with pytest.raises(ValueError):
+        irv_assertions(NO_CONFIDENCE, steps, 100)
+
+
+def test_margins():
+    audit = _audit()
+    assert [str(assertion) for assertion in audit.assertions] == ["A beats half of all ballots among {A, B, C}"]
+    assert audit.margins.tolist() == [20]
+    assert audit.diluted_margin == pytest.approx(0.2)
+
+
+def test_measure_risk():
+    audit = _audit()
+    risks = audit.measure_risk(VOTES)
+    assert max(risks.values()) <= audit.risk_limit
+    # a sample that disagrees with the reported outcome never confirms it
+    assert max(audit.measure_risk([["B", "A"]] * 100).values()) == 1.0
+
+
+def test_simulation_is_reproducible():
+    audit = _audit()
+    needed = audit.sample_sizes_needed(range(50), 400)
+    assert (needed[[3, 7]] == audit.sample_sizes_needed([3, 7], 400)).all()
+    assert ((needed > 0) & (needed <= 400)).mean() > 0.9
+    probabilities = audit.completion_probability([0, 10, 100, 400], range(50))
+    assert probabilities[0] == 0
+    assert (np.diff(probabilities) >= 0).all()
+    assert audit.expected_sample_size(range(50), 400) <= 400
+
+
+def test_simulation_matches_measured_risk():
+    audit = _audit([["A", "B"]] * 40 + [["B", "A"]] * 35 + [["C", "B"]] * 25)
+    names = np.array(audit.encoded.candidates, dtype=object)
+    for seed in range(5):
+        rows = audit._sample_rows(300, seed)
+        needed = audit.sample_sizes_needed([seed], 300)[0]
+        votes = [names[row[row != -1]].tolist() for row in audit.encoded.ranks[rows]]
+        risks = audit.measure_risk(votes[:needed] if needed > 0 else votes)
+        assert (max(risks.values()) <= audit.risk_limit) == (needed > 0)
+
+
+def test_draw_sample_uses_submission_ids(tmp_path):
+    write_wc_csv(str(tmp_path / "export.csv"), 200, {"Q": 3}, seed=1, spoil_rate=0.2)
+    wc_csv = WildcatConnectionCSV(str(tmp_path / "export.csv"))
+    election = IRVElection(wc_csv.question_formatted_ballots["Q"])
+    winner, steps = election.run()
+    audit = BallotPollingAudit(election, winner, steps)
+    sample = audit.draw_sample(500, seed=42)
+    assert (sample == audit.draw_sample(500, seed=42)).all()
+    assert not set(sample.tolist()) & set(wc_csv.question_spoilt_ballots["Q"])
+    assert set(sample.tolist()) <= set(wc_csv.submission_ids.tolist())
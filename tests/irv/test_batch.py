@@ -0,0 +1,61 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from irv.batch import tabulate_batch, run_batch
+from irv.synthetic import write_wc_csv
+from irv.tabulation import tabulate_question
+from wildcat_connection import WildcatConnectionCSV
+
+
+def _write_orgs(folder: str, num_orgs: int) -> dict[str, str]:
+    sources = {}
+    for i in range(num_orgs):
+        filepath = os.path.join(folder, f"org{i}.csv")
+        write_wc_csv(filepath, 100, {"President": 4, "Treasurer": 3}, seed=i)
+        sources[f"org{i}"] = filepath
+    return sources
+
+
+def test_run_batch_matches_direct(tmp_path):
+    sources = _write_orgs(str(tmp_path), 5)
+    results = run_batch(sources, max_concurrency=2, queue_size=1)
+    assert len(results) == 10
+    for org, filepath in sources.items():
+        wc_csv = WildcatConnectionCSV(filepath)
+        for question, ballots in wc_csv.question_formatted_ballots.items():
+            expected = tabulate_question(question, ballots)
+            [result] = [r for r in results if r.org == org and r.question == question]
+            assert (result.winner, result.steps) == (expected["winner"], expected["steps"])
+            assert result.error is None
+
+
+def test_failed_org_does_not_stop_batch(tmp_path):
+    sources = _write_orgs(str(tmp_path), 2)
+    sources["missing"] = str(tmp_path / "missing.csv")
+    with ThreadPoolExecutor(2) as executor:
+        results = run_batch(sources, executor=executor)
+    errors = [result for result in results if result.error]
+    assert len(results) == 5
+    assert [result.org for result in errors] == ["missing"]
+
+
+def test_break_cancels_outstanding(tmp_path):
+    sources = _write_orgs(str(tmp_path), 6)
+
+    async def first_result():
+        results = tabulate_batch(sources, max_concurrency=1, queue_size=1)
+        try:
+            async for result in results:
+                return result
+        finally:
+            await results.aclose()
+
+    async def main():
+        result = await first_result()
+        await asyncio.sleep(0)
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        return result, pending
+
+    result, pending = asyncio.run(main())
+    assert result.org == "org0"
+    assert pending == []
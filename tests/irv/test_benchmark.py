@@ -0,0 +1,39 @@
+import os
+from irv.benchmark import Scenario, run_scenarios, compare, save_baseline, load_baseline, baseline_path, main
+from irv.synthetic import generate_ballots
+from irv import IRVElection
+
+
+def _tiny_scenarios() -> list[Scenario]:
+    ballots = generate_ballots(200, 5, seed=1)
+    return [Scenario("tiny", lambda folder: lambda: IRVElection(ballots).run())]
+
+
+def test_run_scenarios_measurements():
+    results = run_scenarios(_tiny_scenarios(), repeat=2)
+    assert {"median_s", "p95_s", "peak_tracemalloc_bytes", "peak_rss_kb"} <= set(results["tiny"].keys())
+    assert set(results["tiny"].keys()) <= {"median_s", "p95_s", "peak_tracemalloc_bytes", "peak_rss_kb", "rss_growth_kb"}
+    assert results["tiny"]["p95_s"] >= results["tiny"]["median_s"] > 0
+
+
+def test_baseline_round_trip(tmp_path):
+    results = run_scenarios(_tiny_scenarios(), repeat=2)
+    filepath = baseline_path(str(tmp_path))
+    save_baseline(results, filepath)
+    assert load_baseline(filepath) == results
+
+
+def test_compare_flags_regressions_outside_tolerance():
+    baseline = {"s": {"median_s": 1.0, "p95_s": 1.0, "peak_tracemalloc_bytes": 100, "peak_rss_kb": 100}}
+    within = {"s": {"median_s": 1.1, "p95_s": 1.2, "peak_tracemalloc_bytes": 105, "peak_rss_kb": 100}}
+    slower = {"s": {"median_s": 1.5, "p95_s": 1.2, "peak_tracemalloc_bytes": 105, "peak_rss_kb": 100}}
+    hungrier = {"s": {"median_s": 1.0, "p95_s": 1.0, "peak_tracemalloc_bytes": 200, "peak_rss_kb": 100}}
+    assert compare(baseline, within) == []
+    assert len(compare(baseline, slower)) == 1
+    assert len(compare(baseline, hungrier)) == 1
+    assert compare(baseline, slower, time_tolerance=1.0) == []
+
+
+def test_main_missing_baseline(tmp_path):
+    filepath = os.path.join(str(tmp_path), "missing.json")
+    assert main(["--baseline", filepath, "--repeat", "1", "--only", "irv_run_1k_8"]) == 2
@@ -0,0 +1,23 @@
+import os
+import pytest
+from irv import IRVElection
+from irv.__main__ import run
+from wildcat_connection import WildcatConnectionCSV
+from ..wildcat_connection import SPOILT_EXPORT
+
+
+@pytest.mark.parametrize("policy", ["discard", "skip_gaps", "truncate"])
+def test_spoil_policy(tmp_path, policy):
+    export = str(tmp_path / "export.csv")
+    (tmp_path / "export.csv").write_text(SPOILT_EXPORT)
+    wc_csv = WildcatConnectionCSV(export, spoil_policy=policy)
+    expected = [(question, *IRVElection(ballots).run()) for question, ballots in wc_csv.question_formatted_ballots.items()]
+    output = str(tmp_path / "elections")
+    assert run(export, elections_output=output, spoil_policy=policy) == expected
+    assert sorted(os.listdir(output)) == ["Q.txt", "R.txt"]
+
+
+def test_unknown_spoil_policy(tmp_path):
+    (tmp_path / "export.csv").write_text(SPOILT_EXPORT)
+    with pytest.raises(ValueError, match="spoil_policy"):
+        run(str(tmp_path / "export.csv"), elections_output=str(tmp_path / "elections"), spoil_policy="ignore")
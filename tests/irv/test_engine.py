@@ -0,0 +1,201 @@
+import copy
+import pickle
+import pytest
+import numpy as np
+from irv import IRVElection
+from irv.ballots import RankedChoiceBallots
+from irv.engine import EncodedBallots, EXHAUSTED, TallyCache
+from irv.synthetic import generate_votes
+
+
+def test_encoding_deduplicates():
+    votes = [["B", "A"], ["A"], ["B", "A"], [], ["C", "B", "A"]]
+    encoded = EncodedBallots.from_votes(votes)
+    assert encoded.candidates == ["A", "B", "C"]
+    assert len(encoded.ranks) == 4
+    assert encoded.num_ballots == 5
+    assert encoded.weights[encoded.inverse[0]] == 2
+    assert [encoded.candidates[c] for c in encoded.ranks[encoded.inverse[4]]] == ["C", "B", "A"]
+
+
+def test_destinations_and_tally():
+    encoded = EncodedBallots.from_votes([["B", "A"], ["A"], ["C", "B"], [], ["C"]])
+    destinations = encoded.destinations(encoded.active_mask({"A", "B"}))
+    per_ballot = destinations[encoded.inverse]
+    assert list(per_ballot) == [1, 0, 1, EXHAUSTED, EXHAUSTED]
+    assert list(encoded.tally(destinations)) == [1, 2, 0]
+
+
+def test_transfer_matrix_and_fates():
+    ballot = RankedChoiceBallots([
+        ["A", "B"],
+        ["A", "C"],
+        ["B", "A"],
+        ["B", "C"],
+        ["C", "A"],
+        ["C"],
+        ["A"],
+        ["B"],
+    ])
+    election = IRVElection(ballot, record_transfers=True)
+    winner, steps = election.run()
+    # C is eliminated in round 1: one vote goes to A, one is exhausted
+    assert election.transfer_dicts()[0] == {"C": {"A": 1, "Exhausted": 1}}
+    assert len(election.transfers) == len(steps) - 1
+    fates = np.array(election.ballots.encoded.candidates + ["Exhausted"])[election.ballot_fates]
+    assert list(fates) == ["A", "A", "A", "Exhausted", "A", "Exhausted", "A", "Exhausted"]
+    assert election.transfer_dicts()[1] == {"B": {"A": 1, "Exhausted": 2}}
+
+
+def test_write_transfers(tmp_path):
+    ballot = RankedChoiceBallots([["A", "B"], ["A"], ["B"], ["B"], ["C", "A"]])
+    election = IRVElection(ballot, record_transfers=True)
+    election.run()
+    transfers_file, fates_file = str(tmp_path / "t.csv"), str(tmp_path / "f.txt")
+    election.write_transfers(transfers_file, fates_file)
+    with open(transfers_file) as f:
+        assert f.read().splitlines() == ["round,from,to,votes", '1,"C","A",1']
+    with open(fates_file) as f:
+        assert f.read().splitlines() == ["A", "A", "B", "B", "A"]
+
+
+def test_transfers_are_opt_in(tmp_path):
+    election = IRVElection(RankedChoiceBallots([["A", "B"], ["A"], ["B"], ["B"], ["C", "A"]]))
+    election.run()
+    assert election.transfers == []
+    with pytest.raises(ValueError):
+        election.write_transfers(str(tmp_path / "t.csv"))
+
+
+def test_ballots_from_encoded():
+    votes = [["B", "A"], ["A"], ["B", "A"], []]
+    ballots = RankedChoiceBallots(encoded=EncodedBallots.from_votes(votes))
+    assert len(ballots) == 4
+    assert ballots.votes == votes
+    assert ballots.get_candidates() == {"A", "B"}
+
+
+def test_encoded_duplicates_rejected():
+    encoded = EncodedBallots(["A", "B"], np.array([[0, 1], [1, 1]]), np.ones(2, dtype=np.int64), np.arange(2))
+    with pytest.raises(ValueError):
+        RankedChoiceBallots(encoded=encoded)
+    # rows with weight 0 are not counted, so are not validated
+    encoded.weights = np.array([1, 0])
+    RankedChoiceBallots(encoded=encoded)
+
+
+def test_count_is_cached():
+    encoded = EncodedBallots.from_votes(generate_votes(500, 5, seed=4))
+    active = encoded.active_mask(["Candidate 1", "Candidate 2", "Candidate 3"])
+    destinations, counts = encoded.count(active)
+    assert (destinations == encoded.destinations(active)).all()
+    assert (counts == encoded.tally(destinations)).all()
+    assert encoded.count(active.copy())[0] is destinations
+    assert (encoded.cache.hits, encoded.cache.misses, len(encoded.cache)) == (1, 1, 1)
+
+
+def test_tally_cache_evicts_least_recently_used():
+    encoded = EncodedBallots.from_votes(generate_votes(500, 5, seed=4))
+    masks = [encoded.active_mask(encoded.candidates[:i]) for i in range(2, 6)]
+    entry_bytes = sum(array.nbytes for array in encoded.count(masks[0]))
+    encoded.cache = TallyCache(max_bytes=2 * entry_bytes)
+    encoded.count(masks[0])
+    encoded.count(masks[1])
+    encoded.count(masks[0])
+    encoded.count(masks[2])  # evicts masks[1]
+    assert encoded.cache.evictions == 1
+    assert encoded.cache.nbytes <= encoded.cache.max_bytes
+    encoded.count(masks[0])
+    encoded.count(masks[1])
+    assert (encoded.cache.hits, encoded.cache.misses) == (2, 4)
+
+
+def test_tally_cache_invalidated_when_ballots_change():
+    encoded = EncodedBallots.from_votes([["A", "B"], ["B"], ["A"]])
+    active = encoded.active_mask(["A", "B"])
+    assert encoded.count(active)[1].tolist() == [2, 1]
+    # cached ballots can't be changed in place, only replaced
+    with pytest.raises(ValueError):
+        encoded.weights[0] = 5
+    encoded.weights = np.array([5, 1, 1])
+    assert len(encoded.cache) == 0
+    assert encoded.count(active)[1].tolist() == [6, 1]
+
+    ballots = RankedChoiceBallots([["A", "B"], ["B"]])
+    assert ballots.encoded.count(ballots.encoded.active_mask(["A", "B"]))[1].tolist() == [1, 1]
+    ballots.votes = [["B", "A"], ["B"]]
+    assert ballots.encoded.count(ballots.encoded.active_mask(["A", "B"]))[1].tolist() == [0, 2]
+    # appending to the votes in place also drops the encoded ballots, see test_votes_edited_in_place
+    ballots.votes.append(["A"])
+    assert ballots.encoded.count(ballots.encoded.active_mask(["A", "B"]))[1].tolist() == [1, 2]
+
+
+def test_pickled_store_is_read_only():
+    encoded = EncodedBallots.from_votes([["A", "B"], ["B"], ["A"]])
+    active = encoded.active_mask(["A", "B"])
+    encoded.count(active)
+    unpickled = pickle.loads(pickle.dumps(encoded))
+    assert not unpickled.ranks.flags.writeable and not unpickled.weights.flags.writeable
+    assert len(unpickled.cache) == 0
+    assert unpickled.count(active)[1].tolist() == [2, 1]
+
+
+def test_tally_cache_not_stale_when_caller_edits_arrays():
+    ranks, weights = np.array([[0, 1], [1, -1], [0, -1]]), np.ones(3, dtype=np.int64)
+    encoded = EncodedBallots(["A", "B"], ranks, weights, np.arange(3))
+    active = encoded.active_mask(["A", "B"])
+    assert encoded.count(active)[1].tolist() == [2, 1]
+    # the store copied the caller's arrays, so editing them changes nothing
+    ranks[0] = [1, 0]
+    weights[2] = 5
+    assert encoded.count(active)[1].tolist() == [2, 1]
+    assert encoded.count(active)[1].tolist() == encoded.tally(encoded.destinations(active)).tolist()
+
+    # arrays nothing can write to are shared, not copied
+    ranks.flags.writeable = weights.flags.writeable = False
+    shared = EncodedBallots(["A", "B"], ranks, weights, np.arange(3))
+    assert np.shares_memory(shared.ranks, ranks) and np.shares_memory(shared.weights, weights)
+    # a read-only view of an array that can still be written to is copied
+    base = np.array([[0, 1]])
+    view = base.view()
+    view.flags.writeable = False
+    assert not np.shares_memory(EncodedBallots(["A", "B"], view, np.ones(1), np.arange(1)).ranks, base)
+
+
+def test_repeated_elections_hit_cache():
+    ballots = RankedChoiceBallots(generate_votes(1000, 6, seed=2))
+    first = IRVElection(ballots).run()
+    misses = ballots.encoded.cache.misses
+    assert IRVElection(ballots).run() == first
+    assert ballots.encoded.cache.misses == misses
+
+
+def test_drop_votes():
+    votes = generate_votes(100, 4, seed=1)
+    ballots = RankedChoiceBallots(votes)
+    winner = IRVElection(ballots).run()
+    ballots.drop_votes()
+    assert ballots._votes is None
+    assert not hasattr(ballots, "__dict__")
+    assert IRVElection(ballots).run() == winner
+    assert ballots.votes == votes
+
+
+def test_votes_edited_in_place():
+    ballots = RankedChoiceBallots([["A", "B"], ["B"]])
+    assert list(ballots.encoded.count(ballots.encoded.active_mask({"A", "B"}))[1]) == [1, 1]
+    ballots.votes.append(["A"])
+    assert len(ballots) == 3
+    ballots.votes[1][0] = "A"
+    assert list(ballots.encoded.count(ballots.encoded.active_mask({"A", "B"}))[1]) == [3, 0]
+    ballots.votes[2].append("C")
+    assert ballots.get_candidates() == {"A", "B", "C"}
+    assert IRVElection(ballots).run()[0] == "A"
+
+
+def test_votes_pickle_and_copy():
+    ballots = pickle.loads(pickle.dumps(RankedChoiceBallots([["A", "B"], ["B"]])))
+    assert type(copy.deepcopy(ballots.votes)[0]) is list
+    ballots.encoded
+    ballots.votes.pop()
+    assert len(ballots) == 1
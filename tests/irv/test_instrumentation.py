@@ -0,0 +1,55 @@
+import os
+from irv import IRVElection
+from irv.ballots import RankedChoiceBallots
+from irv.instrumentation import TimingCollector, profiling
+from wildcat_connection import WildcatConnectionCSV
+from ..wildcat_connection import TEST_CASE_FOLDER_WC
+
+
+def test_round_events_match_steps():
+    ballot = RankedChoiceBallots([
+        ["winner", "loser1"],
+        ["winner", "loser1", "loser2"],
+        ["loser2", "winner", "loser1"],
+        ["loser2", "loser1", "winner"],
+        ["loser1", "winner", "loser2"],
+    ])
+    collector = TimingCollector()
+    winner, steps = IRVElection(ballot, name="test", observer=collector).run()
+    assert len(collector.rounds) == len(steps)
+    assert [event.round for event in collector.rounds] == list(range(len(steps)))
+    assert all(event.election == "test" and event.ballots == 5 for event in collector.rounds)
+    assert collector.rounds[0].transfers == sum(collector.rounds[0].eliminated.values())
+    assert collector.stage_totals().keys() == {"tabulate"}
+    [cache] = collector.caches
+    assert cache.election == "test" and cache.misses == len(steps) and cache.hits == 0
+
+    IRVElection(ballot, name="again", observer=collector).run()
+    assert collector.caches[1].hit_rate == 1.0
+    assert "Tally cache" in collector.summary()
+
+
+def test_tie_break_depth_recorded():
+    ballot = RankedChoiceBallots([
+        ["A", "B"],
+        ["A", "C"],
+        ["B", "A"],
+        ["C", "B"],
+        ["D", "A"],
+        ["D", "A"],
+    ])
+    collector = TimingCollector()
+    IRVElection(ballot, observer=collector).run()
+    assert collector.rounds[0].tie_break_depth >= 1
+    assert "tie breaks" in collector.summary()
+
+
+def test_wildcat_connection_stages():
+    collector = TimingCollector()
+    with profiling(collector, trace_memory=True):
+        wc_csv = WildcatConnectionCSV(os.path.join(TEST_CASE_FOLDER_WC, "multiple_questions1.csv"), observer=collector)
+    stages = [event.stage for event in collector.stages]
+    # each parsing stage is reported once, under its own name
+    assert stages[:5] == ["parse", "validate", "encode", "spoil", "tensor"]
+    assert stages.count("ballots") == len(wc_csv.question_num_candidates)
+    assert collector.peak_memory > 0
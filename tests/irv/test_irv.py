@@ -1,5 +1,6 @@
 import pytest
 from irv import IRVElection
+from irv.readers import load_ballots
 from . import get_test_case_filepaths, tie_test_cases, non_tie_test_cases, real_winner
 
 
@@ -23,16 +24,14 @@ def test_files_formatpath(test_filepath):
 
 @pytest.mark.parametrize("test_filepath", non_tie_test_cases())
 def test_winner_keep_exhausted_ballots_no_ties(test_filepath):
-    with open(test_filepath) as file:
-        irv_election = IRVElection(file, log_to_stderr=True, remove_exhausted_ballots=False)
+    irv_election = IRVElection(load_ballots(test_filepath), log_to_stderr=True, remove_exhausted_ballots=False)
     winner, _ = irv_election.run()
     assert winner == real_winner(test_filepath)
 
 
 @pytest.mark.parametrize("test_filepath", tie_test_cases())
 def test_winner_keep_exhausted_ballots_ties(test_filepath):
-    with open(test_filepath) as file:
-        irv_election = IRVElection(file, log_to_stderr=True, remove_exhausted_ballots=False)
+    irv_election = IRVElection(load_ballots(test_filepath), log_to_stderr=True, remove_exhausted_ballots=False)
     with pytest.warns(UserWarning):
         winner, _ = irv_election.run()
     assert winner.startswith("No Confidence")
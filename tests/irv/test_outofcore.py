@@ -0,0 +1,99 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+from irv import IRVElection
+from irv.ballots import RankedChoiceBallots
+from irv.engine import EncodedBallots
+from irv.outofcore import MemmapWriter, open_memmap, save_memmap
+from irv.readers import load_ballots
+from irv.synthetic import generate_votes
+from . import get_test_case_filepaths
+
+
+def _run(encoded: EncodedBallots, remove_exhausted_ballots: bool = False) -> tuple:
+    election = IRVElection(RankedChoiceBallots(encoded=encoded), remove_exhausted_ballots=remove_exhausted_ballots,
+                           record_transfers=True)
+    winner, steps = election.run()
+    fates = election.ballot_fates
+    return winner, steps, election.transfer_dicts(), None if fates is None else fates.tolist()
+
+
+@pytest.mark.parametrize("remove_exhausted_ballots", [False, True])
+def test_memmap_matches_in_memory(tmp_path, remove_exhausted_ballots):
+    encoded = EncodedBallots.from_votes(generate_votes(3000, 9, seed=4))
+    save_memmap(str(tmp_path), encoded)
+    # a tiny budget, so every pass is split into many chunks
+    on_disk = open_memmap(str(tmp_path), memory_budget=2000)
+    assert isinstance(on_disk.ranks, np.memmap)
+    assert 1 < len(list(on_disk._row_slices())) < len(on_disk.ranks)
+    assert _run(on_disk, remove_exhausted_ballots) == _run(encoded, remove_exhausted_ballots)
+
+
+@pytest.mark.parametrize("test_filepath", get_test_case_filepaths())
+def test_memmap_matches_test_cases(tmp_path, test_filepath):
+    encoded = load_ballots(test_filepath).encoded
+    save_memmap(str(tmp_path), encoded)
+    assert _run(open_memmap(str(tmp_path), memory_budget=1)) == _run(encoded)
+
+
+@pytest.mark.parametrize("record_transfers", [False, True])
+def test_one_pass_per_round(tmp_path, monkeypatch, record_transfers):
+    save_memmap(str(tmp_path), EncodedBallots.from_votes(generate_votes(3000, 9, seed=4)))
+    on_disk = open_memmap(str(tmp_path), memory_budget=2000)
+    num_chunks = len(list(on_disk._row_slices()))
+    # validating the ballots reads them once up front
+    election = IRVElection(RankedChoiceBallots(encoded=on_disk), record_transfers=record_transfers)
+    passes, decoded = [], []
+    row_slices, first_active = EncodedBallots._row_slices, EncodedBallots._first_active
+    monkeypatch.setattr(EncodedBallots, "_row_slices", lambda self: passes.append(1) or row_slices(self))
+    monkeypatch.setattr(EncodedBallots, "_first_active",
+                        staticmethod(lambda *args: decoded.append(1) or first_active(*args)))
+    _, steps = election.run()
+    # the ballots are read once per round; transfers only add finding the previous round's destinations
+    assert len(passes) == len(steps)
+    assert len(decoded) == num_chunks * (len(steps) + (len(steps) - 1 if record_transfers else 0))
+
+
+def test_writer_appends_chunks(tmp_path):
+    votes = generate_votes(2000, 6, seed=1)
+    with MemmapWriter(str(tmp_path), sorted({name for ballot in votes for name in ballot}), width=6) as writer:
+        for start in range(0, len(votes), 300):
+            writer.append(EncodedBallots.from_votes(votes[start:start + 300]))
+    assert writer.num_ballots == len(votes)
+
+    on_disk = open_memmap(str(tmp_path), memory_budget=4096)
+    assert on_disk.decode() == votes
+    assert _run(on_disk) == _run(EncodedBallots.from_votes(votes))
+
+
+def test_writer_rejects_mismatched_chunks(tmp_path):
+    with MemmapWriter(str(tmp_path), ["A", "B"], width=1) as writer:
+        with pytest.raises(ValueError):
+            writer.append(EncodedBallots.from_votes([["C"]]))
+        with pytest.raises(ValueError):
+            writer.append(EncodedBallots.from_votes([["A", "B"]]))
+        writer.append(EncodedBallots.from_votes([["B"], []]))
+    assert open_memmap(str(tmp_path)).decode() == [["B"], []]
+
+
+def test_memory_stays_within_budget(tmp_path):
+    # every ballot unique, so one code per ballot alone would be more than the budget
+    num_ballots, budget = 300_000, 2**16
+    rng = np.random.default_rng(3)
+    ranks = rng.permuted(np.tile(np.arange(12, dtype=np.int8), (num_ballots, 1)), axis=1)[:, :6]
+    ranks[np.arange(6) >= rng.integers(1, 7, num_ballots)[:, None]] = -1
+    save_memmap(str(tmp_path), EncodedBallots([f"Candidate {i}" for i in range(12)], ranks,
+                                              np.ones(num_ballots, dtype=np.int64), np.arange(num_ballots)))
+
+    election = IRVElection(RankedChoiceBallots(encoded=open_memmap(str(tmp_path), memory_budget=budget)),
+                           record_transfers=True)
+    tracemalloc.start()
+    try:
+        _, steps = election.run()
+        election.write_transfers(str(tmp_path / "transfers.csv"), str(tmp_path / "fates.txt"))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert len(election.transfers) == len(steps) - 1
+    assert peak < 2 * budget < num_ballots
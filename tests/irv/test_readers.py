@@ -0,0 +1,81 @@
+import io
+import pytest
+from irv import IRVElection
+from irv.ballots import RankedChoiceBallots
+from irv.readers import read_blt, read_csv, load_ballots
+from . import get_test_case_filepaths
+
+BLT = """\
+4 1
+-4
+3 1 2 0
+2 3 1 0  # comments are ignored
+1 2 0
+2 1 2 0
+1 4 3 0
+1 0
+0
+"Alice"
+"Bob"
+"Carol"
+"Dan"
+"Mayor"
+"""
+
+
+@pytest.mark.parametrize("test_filepath", get_test_case_filepaths())
+def test_read_csv_matches_list_of_votes(test_filepath):
+    with open(test_filepath) as file:
+        votes = [[name.strip() for name in line.strip().split(",") if name.strip()]
+                 for line in file if not line.startswith("#")]
+    encoded = read_csv(test_filepath)
+    assert encoded.decode() == votes
+    assert encoded.num_ballots == len(votes)
+    assert len(encoded.ranks) == len({tuple(ballot) for ballot in votes})
+
+
+def test_read_csv_quoted_names():
+    encoded = read_csv(io.StringIO('# comment\n"Smith, J",Doe\n  Doe , "Smith, J" ,\n"Smith, J",Doe\n'))
+    assert encoded.candidates == ["Doe", "Smith, J"]
+    assert encoded.decode() == [["Smith, J", "Doe"], ["Doe", "Smith, J"], ["Smith, J", "Doe"]]
+    assert encoded.weights.tolist() == [2, 1]
+
+
+def test_read_blt():
+    encoded = read_blt(io.StringIO(BLT))
+    assert encoded.candidates == ["Alice", "Bob", "Carol"]
+    assert encoded.num_ballots == 10
+    assert encoded.weights.tolist() == [5, 2, 1, 1, 1]
+    assert encoded.decode()[:6] == [["Alice", "Bob"]] * 5 + [["Carol", "Alice"]]
+    assert encoded.decode()[-2:] == [["Carol"], []]
+
+
+def test_read_blt_matches_csv(tmp_path):
+    (tmp_path / "mayor.blt").write_text(BLT)
+    (tmp_path / "mayor.csv").write_text("Alice,Bob\n" * 5 + "Carol,Alice\n" * 2 + "Bob\nCarol\n\n")
+    blt = IRVElection(load_ballots(str(tmp_path / "mayor.blt"))).run()
+    csv = IRVElection(load_ballots(str(tmp_path / "mayor.csv"))).run()
+    assert blt == csv
+    assert blt[0] == "Alice"
+
+
+@pytest.mark.parametrize("contents", [
+    "3 2\n1 1 0\n0\n\"A\"\n\"B\"\n\"C\"\n\"T\"\n",  # two seats
+    "3 1\n1 1=2 0\n0\n\"A\"\n\"B\"\n\"C\"\n\"T\"\n",  # equal rankings
+    "3 1\n0.5 1 0\n0\n\"A\"\n\"B\"\n\"C\"\n\"T\"\n",  # fractional weight
+    "3 1\n1 4 0\n0\n\"A\"\n\"B\"\n\"C\"\n\"T\"\n",  # unknown candidate
+    "3 1\n1 1 2\n0\n\"A\"\n\"B\"\n\"C\"\n\"T\"\n",  # unterminated ballot
+    "3 1\n1 1 0\n",  # no end of ballots marker
+    "3 1\n1 1 0\n0\n\"A\"\n",  # missing names
+    "",
+])
+def test_read_blt_malformed(contents):
+    with pytest.raises(ValueError):
+        read_blt(io.StringIO(contents))
+
+
+def test_duplicate_votes_rejected():
+    with pytest.raises(ValueError):
+        RankedChoiceBallots(encoded=read_csv(io.StringIO("A,B,A\n")))
+    with pytest.raises(ValueError):
+        RankedChoiceBallots(encoded=read_blt(io.StringIO("2 1\n1 1 2 1 0\n0\n\"A\"\n\"B\"\n\"T\"\n")))
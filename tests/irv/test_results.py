@@ -0,0 +1,80 @@
+import json
+import pytest
+from irv import IRVElection
+from irv.ballots import RankedChoiceBallots
+from irv.batch import run_batch
+from irv.results import ResultsWriter, format_results, read_results, render_text, record_rows
+from irv.synthetic import generate_ballots, write_wc_csv
+from irv.tabulation import tabulate_question
+
+QUESTIONS = {"President": 4, "1": 3}
+
+
+def _records() -> list[dict]:
+    records = []
+    for seed, (question, num_candidates) in enumerate(QUESTIONS.items()):
+        record = tabulate_question(question, generate_ballots(200, num_candidates, seed=seed))
+        record["org"] = "Slivka"
+        records.append(record)
+    return records
+
+
+@pytest.mark.parametrize("extension", ["jsonl", "csv"])
+def test_round_trip(tmp_path, extension):
+    records = _records()
+    filepath = str(tmp_path / f"results.{extension}")
+    with ResultsWriter(filepath) as writer:
+        for record in records:
+            writer.write(record)
+    assert writer.num_records == 2
+
+    reads = read_results(filepath)
+    assert len(reads) == len(records)
+    for record, read in zip(records, reads):
+        if extension == "csv":
+            del record["spoilt_ballots"]
+        assert read == record
+        assert render_text(read) == render_text(record)
+
+
+def test_csv_rows(tmp_path):
+    record = _records()[0]
+    rows = record_rows(record)
+    assert len(rows) == sum(len(step) for step in record["steps"])
+    assert rows[0][:5] == ("Slivka", "President", record["winner"], 200, 1)
+
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    records = _records()
+    filepath = str(tmp_path / "results.parquet")
+    with ResultsWriter(filepath, row_group_size=1) as writer:
+        for record in records:
+            writer.write(record)
+    assert [read["steps"] for read in read_results(filepath)] == [record["steps"] for record in records]
+
+
+def test_render_text_matches_election_report():
+    ballots = RankedChoiceBallots([["A", "B"], ["B"], ["A"], ["C", "B"]])
+    election = IRVElection(ballots)
+    winner, steps = election.run()
+    record = tabulate_question("Q", ballots)
+    assert election.results_string(winner, steps) == format_results(winner, steps, 4)
+    assert render_text(record) == format_results(winner, [dict(step) for step in steps], 4)
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        ResultsWriter(str(tmp_path / "results.txt"))
+
+
+def test_batch_results(tmp_path):
+    write_wc_csv(str(tmp_path / "slivka.csv"), 50, {"President": 3}, seed=0, spoil_rate=0)
+    filepath = str(tmp_path / "results.jsonl")
+    with ResultsWriter(filepath) as writer:
+        for result in run_batch({"Slivka": str(tmp_path / "slivka.csv")}):
+            writer.write(result.record())
+    with open(filepath) as file:
+        [line] = file.readlines()
+    record = json.loads(line)
+    assert (record["org"], record["question"], record["num_ballots"]) == ("Slivka", "President", 50)
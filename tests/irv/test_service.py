@@ -0,0 +1,153 @@
+import io
+import json
+import os
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from irv.engine import save_encoded
+import irv.service
+from irv.service import TabulationService, make_server, NPZ_CONTENT_TYPE
+from irv.tabulation import parse_upload, tabulate_question
+from wildcat_connection.utils import ParsingException
+from wildcat_connection import WildcatConnectionCSV
+from ..wildcat_connection import TEST_CASE_FOLDER_WC
+
+TEST_CASE = os.path.join(TEST_CASE_FOLDER_WC, "multiple_questions1.csv")
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    service = TabulationService(max_workers=2)
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+
+def _post(url: str, data: bytes, content_type: str = "text/csv") -> dict:
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": content_type})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def _expected_results() -> list[dict]:
+    wc_csv = WildcatConnectionCSV(TEST_CASE)
+    return [tabulate_question(question, ballots, spoilt_ballots=wc_csv.question_spoilt_ballots[question])
+            for question, ballots in wc_csv.question_formatted_ballots.items()]
+
+
+def test_health(server_url):
+    with urllib.request.urlopen(f"{server_url}/health") as response:
+        assert json.loads(response.read()) == {"status": "ok", "workers": 2}
+
+
+def test_tabulate_export_and_cache(server_url):
+    with open(TEST_CASE, "rb") as file:
+        data = file.read()
+    first = _post(f"{server_url}/tabulate", data)
+    assert not first["cached"]
+    assert first["results"] == _expected_results()
+    second = _post(f"{server_url}/tabulate", data)
+    assert second["cached"] and second["results"] == first["results"]
+    assert not _post(f"{server_url}/tabulate?remove_exhausted_ballots=1", data)["cached"]
+
+
+def test_tabulate_encoded(server_url):
+    wc_csv = WildcatConnectionCSV(TEST_CASE)
+    buffer = io.BytesIO()
+    save_encoded(buffer, {question: ballots.encoded for question, ballots in wc_csv.question_formatted_ballots.items()})
+    response = _post(f"{server_url}/tabulate", buffer.getvalue(), NPZ_CONTENT_TYPE)
+    expected = _expected_results()
+    for result in expected:
+        result["spoilt_ballots"] = []
+    assert response["results"] == expected
+
+
+def test_concurrent_requests(server_url):
+    with open(TEST_CASE, "rb") as file:
+        data = file.read()
+    bodies = [data + b"\n" * i for i in range(4)]  # distinct hashes, same ballots
+    responses = [None] * len(bodies)
+
+    def post(i):
+        responses[i] = _post(f"{server_url}/tabulate", bodies[i])
+    threads = [threading.Thread(target=post, args=(i,)) for i in range(len(bodies))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(response["results"] == _expected_results() for response in responses)
+
+
+def test_bad_upload(server_url):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        _post(f"{server_url}/tabulate", b"not,a\nwildcat,export")
+    assert error.value.code == 400
+
+
+def test_bad_duplicate_policy(server_url):
+    with open(TEST_CASE, "rb") as file:
+        data = file.read()
+    with pytest.raises(urllib.error.HTTPError) as error:
+        _post(f"{server_url}/tabulate?duplicate_policy=keep", data)
+    assert error.value.code == 400
+
+
+def test_bad_encoded_upload(server_url):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        _post(f"{server_url}/tabulate", b"PK\x03\x04 truncated", NPZ_CONTENT_TYPE)
+    assert error.value.code == 400
+
+
+def test_internal_error(monkeypatch):
+    def fail(*args):
+        raise RuntimeError("worker died")
+    monkeypatch.setattr(irv.service, "tabulate_question", fail)
+    with ThreadPoolExecutor(1) as executor:
+        server = make_server(TabulationService(executor=executor), port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            with pytest.raises(urllib.error.HTTPError) as error:
+                with open(TEST_CASE, "rb") as file:
+                    _post(f"http://127.0.0.1:{server.server_address[1]}/tabulate", file.read())
+        finally:
+            server.shutdown()
+            server.server_close()
+    assert error.value.code == 500
+    assert json.loads(error.value.read()) == {"error": "RuntimeError: worker died"}
+
+
+class _RecordingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(2)
+        self.submitted = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted.append(fn)
+        return super().submit(fn, *args, **kwargs)
+
+
+def test_questions_run_in_parallel():
+    with open(TEST_CASE, "rb") as file:
+        data = file.read()
+    with _RecordingExecutor() as executor:
+        service = TabulationService(executor=executor)
+        assert service.tabulate(data)["results"] == _expected_results()
+    # parsed once, then one task per question
+    assert executor.submitted == [parse_upload] + [tabulate_question] * len(_expected_results())
+
+
+def test_cache_key_includes_format():
+    with open(TEST_CASE, "rb") as file:
+        data = file.read()
+    with ThreadPoolExecutor(1) as executor:
+        service = TabulationService(executor=executor)
+        service.tabulate(data)
+        # the same bytes as encoded ballots aren't answered from the cached CSV results
+        with pytest.raises(ParsingException):
+            service.tabulate(data, encoded=True)
@@ -0,0 +1,71 @@
+import pytest
+from irv import IRVElection
+from irv.ballots import RankedChoiceBallots
+from irv.constants import NO_CONFIDENCE, UNBREAKABLE_TIE_WINNER
+from irv.readers import load_ballots
+from irv.ties import analyze_ties
+from . import non_tie_test_cases, tie_test_cases
+
+
+@pytest.mark.parametrize("test_filepath", non_tie_test_cases())
+def test_analysis_follows_count(test_filepath):
+    election = IRVElection(load_ballots(test_filepath))
+    winner, _ = election.run()
+    analysis = analyze_ties(election)
+    assert analysis.complete
+    assert analysis.winners == {winner: 1}
+    assert analysis.ties == {}
+
+
+@pytest.mark.parametrize("test_filepath", tie_test_cases())
+def test_analysis_of_test_case_ties(test_filepath):
+    election = IRVElection(load_ballots(test_filepath), analyze_ties=True)
+    with pytest.warns(UserWarning):
+        election.run()
+    assert election.tie_analysis.complete
+    assert election.tie_analysis.ties == {frozenset("ABC"): ["B", "C"]}
+
+
+def test_irrelevant_tie():
+    # A and B tie unbreakably, and either way their votes go to C
+    ballots = RankedChoiceBallots([["A", "C"]] * 2 + [["B", "C"]] * 2 + [["C"]] * 3)
+    election = IRVElection(ballots, analyze_ties=True)
+    with pytest.warns(UserWarning):
+        winner, steps = election.run()
+    assert winner == UNBREAKABLE_TIE_WINNER
+    analysis = election.tie_analysis
+    assert analysis.decisive and analysis.winner == "C"
+    assert analysis.winners == {"C": 2}
+    assert analysis.ties == {frozenset("ABC"): ["A", "B"]}
+    assert "elects C, no new election is needed" in election.results_string(winner, steps)
+
+
+def test_deciding_tie():
+    tie_1 = next(test_file for test_file in tie_test_cases() if test_file.endswith("tie_1.csv"))
+    election = IRVElection(load_ballots(tie_1), analyze_ties=True)
+    with pytest.warns(UserWarning):
+        election.run()
+    analysis = election.tie_analysis
+    assert not analysis.decisive and analysis.winner is None
+    assert analysis.winners == {"C": 1, NO_CONFIDENCE: 1}
+
+
+@pytest.mark.parametrize("workers", [1, None])
+def test_nested_ties_are_memoized(workers):
+    # every candidate always ties with every other, so each subset of them is reached
+    candidates = [f"Candidate {i}" for i in range(6)]
+    election = IRVElection(RankedChoiceBallots([[name] for name in candidates]))
+    analysis = analyze_ties(election, workers=workers)
+    assert analysis.complete
+    assert analysis.states == 2**6 - 1
+    # 6! elimination orders, each ending with the last candidate on a sixth of the votes
+    assert analysis.winners == {NO_CONFIDENCE: 720}
+
+
+def test_branch_budget():
+    election = IRVElection(RankedChoiceBallots([[f"Candidate {i}"] for i in range(6)]))
+    analysis = analyze_ties(election, max_states=10)
+    assert not analysis.complete and not analysis.decisive
+    assert analysis.winners == {}
+    assert analysis.states <= 10
+    assert "stopped" in analysis.summary()
@@ -0,0 +1,106 @@
+import os
+import argbind
+import pytest
+from irv import IRVElection
+from irv.__main__ import _election_options, run
+from irv.synthetic import write_wc_csv
+from irv.watch import FolderWatcher, WATCH_CACHE_FILENAME
+from wildcat_connection import WildcatConnectionCSV
+from ..wildcat_connection import SPOILT_EXPORT
+
+
+def _setup(tmp_path):
+    folder, output = tmp_path / "exports", tmp_path / "elections"
+    folder.mkdir()
+    write_wc_csv(str(folder / "slivka.csv"), 60, {"President": 4, "Treasurer": 3}, seed=0)
+    return str(folder), str(output)
+
+
+def test_only_changed_exports_are_tabulated(tmp_path):
+    folder, output = _setup(tmp_path)
+    watcher = FolderWatcher(folder, output, debounce=0)
+    export = os.path.join(folder, "slivka.csv")
+
+    results = watcher.poll()
+    assert list(results.keys()) == [export]
+    assert sorted(os.listdir(os.path.join(output, "slivka"))) == ["President.txt", "Treasurer.txt"]
+    assert watcher.poll() == {}
+
+    # touched but same contents: skipped by content hash
+    stat = os.stat(export)
+    os.utime(export, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert watcher.poll() == {}
+
+    write_wc_csv(str(tmp_path / "exports" / "willard.csv"), 30, {"President": 3}, seed=1)
+    write_wc_csv(export, 80, {"President": 4, "Treasurer": 3}, seed=2)
+    assert sorted(watcher.poll().keys()) == [export, os.path.join(folder, "willard.csv")]
+    assert not [name for name in os.listdir(output) if name.startswith(".tmp-")]
+
+    # a restarted watcher reuses the saved hashes
+    assert os.path.exists(os.path.join(output, WATCH_CACHE_FILENAME))
+    assert FolderWatcher(folder, output, debounce=0).poll() == {}
+
+
+def test_debounce_waits_for_writes_to_settle(tmp_path):
+    folder, output = _setup(tmp_path)
+    watcher = FolderWatcher(folder, output, debounce=60)
+    assert watcher.poll() == {}
+    assert not os.path.exists(output)
+
+
+def test_bad_export_is_skipped(tmp_path):
+    folder, output = _setup(tmp_path)
+    with open(os.path.join(folder, "partial.csv"), "w") as file:
+        file.write("Synthetic Election\n\nSubmissionId,\"President - 1\"\n\"1")
+    results = FolderWatcher(folder, output, debounce=0).poll()
+    assert list(results.keys()) == [os.path.join(folder, "slivka.csv")]
+
+
+def test_options_are_passed_through(tmp_path):
+    folder, output = _setup(tmp_path)
+    FolderWatcher(folder, output, debounce=0, transfers_output=True).poll()
+    assert sorted(os.listdir(os.path.join(output, "slivka"))) == [
+        "President.txt", "President_fates.txt", "President_transfers.csv",
+        "Treasurer.txt", "Treasurer_fates.txt", "Treasurer_transfers.csv",
+    ]
+    # the same export with different options is tabulated again
+    assert FolderWatcher(folder, output, debounce=0, transfers_output=True).poll() == {}
+    assert list(FolderWatcher(folder, output, debounce=0, spoil_policy="truncate").poll()) == [
+        os.path.join(folder, "slivka.csv")
+    ]
+
+
+@pytest.mark.parametrize("policy", ["discard", "skip_gaps", "truncate"])
+def test_spoil_policy(tmp_path, policy):
+    folder = tmp_path / "exports"
+    folder.mkdir()
+    (folder / "export.csv").write_text(SPOILT_EXPORT)
+    wc_csv = WildcatConnectionCSV(str(folder / "export.csv"), spoil_policy=policy)
+    expected = [(question, *IRVElection(ballots).run()) for question, ballots in wc_csv.question_formatted_ballots.items()]
+    watched = FolderWatcher(str(folder), str(tmp_path / "watch"), debounce=0, spoil_policy=policy).poll()
+    assert watched == {str(folder / "export.csv"): expected}
+
+
+def test_election_options_change_the_digest(tmp_path):
+    folder, output = _setup(tmp_path)
+    export = os.path.join(folder, "slivka.csv")
+    assert list(FolderWatcher(folder, output, debounce=0).poll()) == [export]
+    # only remove_exhausted_ballots changed, so a restarted watcher tabulates the export again
+    assert list(FolderWatcher(folder, output, debounce=0, remove_exhausted_ballots=True).poll()) == [export]
+    assert FolderWatcher(folder, output, debounce=0, remove_exhausted_ballots=True).poll() == {}
+    assert list(FolderWatcher(folder, output, debounce=0, remove_exhausted_ballots=True,
+                              tie_branch_budget=10).poll()) == [export]
+
+
+def test_election_options_from_command_line():
+    assert _election_options() == {"remove_exhausted_ballots": False, "analyze_ties": False, "tie_branch_budget": 10000}
+    with argbind.scope({"remove_exhausted_ballots": True, "analyze_ties": True}):
+        assert _election_options() == {"remove_exhausted_ballots": True, "analyze_ties": True,
+                                       "tie_branch_budget": 10000}
+
+
+def test_unsupported_flags_rejected(tmp_path):
+    folder, output = _setup(tmp_path)
+    with pytest.raises(ValueError, match="--results_file"):
+        run(folder, elections_output=output, watch=True, results_file=str(tmp_path / "results.csv"))
+    assert not os.path.exists(output)
@@ -14,6 +14,17 @@ TEST_CASE_INVALID = str(os.environ.get(
     "TEST_CASE_INVALID",
     os.path.join(os.path.dirname(__file__), "test_invalid")))
 
+# an export with a gap (2), a repeated candidate (3) and a candidate not in Q's valid candidates (4)
+SPOILT_EXPORT = """Spoil Test
+
+"SubmissionId","Q - 1","Q - 2","Q - 3","R - 1","R - 2"
+"1","A","B","C","X","Y"
+"2","A","","B","X",""
+"3","B","A","B","","Y"
+"4","Z","A","","X","X"
+"5","","","","Y","X"
+"""
+
 
 class WCTestCase:
     """Test Case containing data for WC test cases"""
@@ -1,6 +1,9 @@
+import os
 import pytest
-from . import get_test_cases, invalid_ranks_test_cases
+import numpy as np
+from . import get_test_cases, invalid_ranks_test_cases, SPOILT_EXPORT
 from wildcat_connection import WildcatConnectionCSV
+from irv.synthetic import write_wc_csv
 from wildcat_connection.utils import ParsingException
 
 
@@ -26,3 +29,96 @@ def test_duplicate_questions(duplicate_question_test_case):
 def test_invalid_ranks(test_case):
     with pytest.raises(ParsingException):
         WildcatConnectionCSV(test_case.filepath)
+
+
+@pytest.mark.parametrize("test_case", get_test_cases())
+def test_ballot_tensor_views(test_case):
+    wc_csv = WildcatConnectionCSV(test_case.filepath)
+    num_questions = len(wc_csv.question_num_candidates)
+    assert wc_csv.ballot_tensor.shape[:2] == (num_questions, len(wc_csv.submission_ids))
+    assert wc_csv.spoiled_mask.shape == wc_csv.ballot_tensor.shape[:2]
+    for question, ballots in wc_csv.question_formatted_ballots.items():
+        encoded = ballots.encoded
+        assert np.shares_memory(encoded.ranks, wc_csv.ballot_tensor)
+        assert encoded.candidates == wc_csv.question_candidates[question]
+        assert len(ballots) == len(ballots.votes)
+        assert len(ballots) + len(wc_csv.question_spoilt_ballots[question]) == len(wc_csv.submission_ids)
+    # the views share the tensor, so it can't be edited in place under their cached counts
+    with pytest.raises(ValueError):
+        wc_csv.ballot_tensor[..., 0] = -1
+
+
+def _write_exports(folder, first_ids, questions=None):
+    filepaths = []
+    for i, first_id in enumerate(first_ids):
+        filepath = os.path.join(folder, f"export{i}.csv")
+        write_wc_csv(filepath, 50, questions or {"Q": 4, "R": 3}, seed=i, first_submission_id=first_id)
+        filepaths.append(filepath)
+    return filepaths
+
+
+def test_merge_exports(tmp_path):
+    filepaths = _write_exports(str(tmp_path), [0, 100, 200])
+    merged = WildcatConnectionCSV(filepaths)
+    assert len(merged.submission_ids) == 150
+    single = [WildcatConnectionCSV(filepath) for filepath in filepaths]
+    for question, ballots in merged.question_formatted_ballots.items():
+        assert ballots.votes == sum((wc_csv.question_formatted_ballots[question].votes for wc_csv in single), [])
+    # directories and os.pathsep separated lists are expanded to the same exports
+    assert WildcatConnectionCSV(str(tmp_path)).csv_filepaths == filepaths
+    assert WildcatConnectionCSV(os.pathsep.join(filepaths)).csv_filepaths == filepaths
+
+
+@pytest.mark.parametrize("policy,num_submissions", [("first", 75), ("last", 75), ("drop", 50)])
+def test_merge_duplicate_policies(tmp_path, policy, num_submissions):
+    filepaths = _write_exports(str(tmp_path), [0, 25])
+    # the caller's to resolve, so not reported as a change of the export format
+    with pytest.raises(ValueError, match="SubmissionId collisions"):
+        WildcatConnectionCSV(filepaths)
+    merged = WildcatConnectionCSV(filepaths, duplicate_policy=policy, max_workers=2)
+    assert len(merged.submission_ids) == num_submissions
+
+
+def test_unknown_duplicate_policy(tmp_path):
+    filepaths = _write_exports(str(tmp_path), [0, 100])
+    with pytest.raises(ValueError, match="duplicate_policy"):
+        WildcatConnectionCSV(filepaths, duplicate_policy="keep")
+
+
+def test_merge_different_questions(tmp_path):
+    (tmp_path / "other").mkdir()
+    filepaths = _write_exports(str(tmp_path), [0]) + _write_exports(str(tmp_path / "other"), [100], {"Q": 4})
+    with pytest.raises(ParsingException):
+        WildcatConnectionCSV(filepaths)
+
+
+@pytest.mark.parametrize("policy,votes,spoilt", [
+    ("discard", [["A", "B", "C"], []], [2, 3, 4]),
+    ("skip_gaps", [["A", "B", "C"], ["A", "B"], ["B", "A"], ["A"], []], []),
+    ("truncate", [["A", "B", "C"], ["A"], ["B", "A"], [], []], []),
+])
+def test_spoil_policies(tmp_path, policy, votes, spoilt):
+    (tmp_path / "export.csv").write_text(SPOILT_EXPORT)
+    wc_csv = WildcatConnectionCSV(str(tmp_path / "export.csv"), spoil_policy=policy,
+                                  valid_candidates={"Q": ["A", "B", "C"]})
+    assert wc_csv.question_formatted_ballots["Q"].votes == votes
+    assert wc_csv.question_spoilt_ballots["Q"] == spoilt
+    # the categories don't depend on the policy, and R accepts any candidate
+    ids = {category: wc_csv.submission_ids[mask[0]].tolist()
+           for category, mask in wc_csv.spoil_category_masks.items()}
+    assert ids == {"gap": [2], "duplicate": [3], "unknown": [4]}
+    assert [mask[1].sum() for mask in wc_csv.spoil_category_masks.values()] == [1, 1, 0]
+
+
+def test_unknown_spoil_policy(tmp_path):
+    (tmp_path / "export.csv").write_text(SPOILT_EXPORT)
+    with pytest.raises(ValueError, match="spoil_policy"):
+        WildcatConnectionCSV(str(tmp_path / "export.csv"), spoil_policy="ignore")
+
+
+def test_dataframe_released(tmp_path):
+    write_wc_csv(str(tmp_path / "export.csv"), 50, {"Q": 3}, seed=0)
+    wc_csv = WildcatConnectionCSV(str(tmp_path / "export.csv"))
+    assert not hasattr(wc_csv, "__dict__")
+    assert wc_csv._WildcatConnectionCSV__df is None
+    assert len(wc_csv.question_formatted_ballots["Q"]) + len(wc_csv.question_spoilt_ballots["Q"]) == 50
@@ -1,3 +1,6 @@
 SUBMISSION_ID_COLNAME = "SubmissionId"
 QUESTION_RANK_SEPARATOR = " - "
 INF = float('inf')
+DUPLICATE_POLICIES = ("error", "first", "last", "drop")
+SPOIL_POLICIES = ("discard", "skip_gaps", "truncate")
+SPOIL_CATEGORIES = ("gap", "duplicate", "unknown")
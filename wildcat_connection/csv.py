@@ -1,10 +1,16 @@
 import os
 import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Optional, Union
+import numpy as np
 import pandas as pd
-from .constants import SUBMISSION_ID_COLNAME, QUESTION_RANK_SEPARATOR
+from .constants import (SUBMISSION_ID_COLNAME, QUESTION_RANK_SEPARATOR, DUPLICATE_POLICIES, SPOIL_POLICIES)
 from . import BALLOT_FOLDER
-from .utils import isnan, wc_update_catcher
+from .utils import wc_update_catcher, expand_export_paths
 from irv.ballots import RankedChoiceBallots
+from irv.engine import EncodedBallots, EXHAUSTED, code_dtype
+from irv.instrumentation import ElectionObserver, StageEvent
 
 
 class WildcatConnectionCSV:
@@ -12,10 +18,14 @@ class WildcatConnectionCSV:
     Class for converting a Wildcat Connection exported ballot CSV into
     the ballot format for the `irv` module.
 
+    Only the int-coded ballots are kept; the parsed DataFrame of strings is released once they are built.
+
     Attributes
     ----------
-    csv_filepath: str
-        Filepath to Wildcat Connection CSV
+    csv_filepath: str or file or list
+        Filepath(s) to Wildcat Connection CSV, as given
+    csv_filepaths: list[str or file]
+        Every export that was read and merged
     question_num_candidates: dict[str, int]
         Maps question name to number of candidates.
     question_formatted_ballots: dict[str, str]
@@ -23,27 +33,173 @@ class WildcatConnectionCSV:
         See `IRVElection` for information about the ballot format
     question_spoilt_ballots: dict[str, list[str]]
         Maps question name to list of SubmissionIDs with spoilt ballots.
+    submission_ids: np.ndarray[int]
+        SubmissionId of every row of the export.
+    ballot_tensor: np.ndarray[int]
+        Int-coded questions x submissions x ranks tensor holding every ballot of the export.
+        `ballot_tensor[q, i, j]` is the code of the candidate submission `i` ranked `(j+1)`th in
+        the `q`th question, or -1 if there is none. Ranks past a question's number of candidates are -1.
+        `question_formatted_ballots` are views into this tensor, with one row per submission rather than
+        one per unique ranking, see `EncodedBallots`. Read-only, so the views can't go stale.
+    question_candidates: dict[str, list[str]]
+        Maps question name to its candidate names, indexed by code in `ballot_tensor`.
+    spoiled_mask: np.ndarray[bool]
+        Questions x submissions mask, True where the ballot is spoilt, i.e. discarded.
+    spoil_category_masks: dict[str, np.ndarray[bool]]
+        Maps each of "gap" (a rank left empty before a later one is filled), "duplicate" (a candidate
+        ranked more than once) and "unknown" (a candidate not in `valid_candidates`) to a questions x submissions
+        mask of ballots with that problem, whatever `spoil_policy` did about it. A ballot can be in several.
 
     Parameters
     ----------
-    csv_filepath : str
-        Filepath to Wildcat Connection exported CSV.
+    csv_filepath : str or file or list
+        Filepath to Wildcat Connection exported CSV, or an open (text or binary) file object.
+        Several exports of the same election (e.g. from several forms) are merged if given as a list,
+        a directory of CSVs, or filepaths separated by `os.pathsep`.
+        All exports must contain the same questions.
+    observer : ElectionObserver, optional
+        Receives "parse", "validate", "encode" (coding every answer), "spoil", "tensor" (recoding each question's
+        answers into `ballot_tensor`) and "ballots" stage events. See `irv.instrumentation`.
+    duplicate_policy : str, optional
+        What to do when merged exports share a SubmissionId:
+        "error" raises, "first" and "last" keep the submission from the first or last export
+        (in `csv_filepaths` order), and "drop" discards every copy. Default: "error"
+    max_workers : int, optional
+        Number of threads parsing exports concurrently. Default: one per export, up to the CPU count
+    spoil_policy : str, optional
+        What to do with ballots that have gaps, duplicate candidates or unknown candidates:
+        "discard" spoils the whole ballot, "skip_gaps" drops the empty ranks, repeated candidates and unknown
+        candidates and moves the remaining rankings up, and "truncate" keeps only the rankings before the
+        first problem. Default: "discard"
+    valid_candidates : dict[str, list[str]], optional
+        Maps question name to the candidates on its ballot paper. Other names in that question's answers
+        are unknown candidates. Questions left out accept any name. Default: None
     """
-    @wc_update_catcher
-    def __init__(self, csv_filepath: str):
+    __slots__ = ("csv_filepath", "csv_filepaths", "observer", "__df", "question_num_candidates", "submission_ids",
+                 "spoil_category_masks", "spoiled_mask", "ballot_tensor", "question_candidates",
+                 "question_formatted_ballots", "question_spoilt_ballots")
+
+    def __init__(self,
+                 csv_filepath: Union[str, IO, list[Union[str, IO]]],
+                 observer: Optional[ElectionObserver] = None,
+                 duplicate_policy: str = "error",
+                 max_workers: Optional[int] = None,
+                 spoil_policy: str = "discard",
+                 valid_candidates: Optional[dict[str, list[str]]] = None):
+        # mistakes in the arguments are raised as they are, not as a change of the export format
+        if duplicate_policy not in DUPLICATE_POLICIES:
+            raise ValueError(f"duplicate_policy must be one of {DUPLICATE_POLICIES}, not {duplicate_policy}")
+        if spoil_policy not in SPOIL_POLICIES:
+            raise ValueError(f"spoil_policy must be one of {SPOIL_POLICIES}, not {spoil_policy}")
         self.csv_filepath = csv_filepath
-        self.__df: pd.DataFrame = self._get_dataframe()
+        self.csv_filepaths: list[str] = expand_export_paths(csv_filepath)
+        self.observer = observer
+        source = os.pathsep.join(self._source_name(filepath) for filepath in self.csv_filepaths)
+        start = time.perf_counter()
+        self.__df: Optional[pd.DataFrame] = self._merge_exports(self._read_exports(max_workers), duplicate_policy)
+        self.submission_ids: np.ndarray = self.__df.index.to_numpy()
+        start = self._emit_stage("parse", start, source)
+        self._encode(source, start, spoil_policy, valid_candidates)
+
+    @wc_update_catcher
+    def _encode(self,
+                source: str,
+                start: float,
+                spoil_policy: str,
+                valid_candidates: Optional[dict[str, list[str]]]) -> None:
+        """
+        Helper function for __init__
+
+        Validates the questions and encodes every ballot, from the merged DataFrame.
+        `start` is when the "validate" stage started. See `__init__` for the other parameters.
+        """
         self.question_num_candidates: dict[str, int] = self._get_question_num_candidates()
+        start = self._emit_stage("validate", start, source)
+        codes, names = self._get_answer_codes()
+        start = self._emit_stage("encode", start, source)
+        self.spoil_category_masks, drop = self._classify_ballots(codes, names, valid_candidates or {})
+        self.spoiled_mask: np.ndarray = self._apply_spoil_policy(codes, drop, spoil_policy)
+        start = self._emit_stage("spoil", start, source)
+        self.ballot_tensor, self.question_candidates = self._get_ballot_tensor(codes, names)
+        self._emit_stage("tensor", start, source)
         formatted_ballots, spoilt_ballots = self._get_ballot_formatted_strings()
         self.question_formatted_ballots: dict[str, RankedChoiceBallots] = formatted_ballots
         self.question_spoilt_ballots: dict[str, list[str]] = spoilt_ballots
+        # everything is int-coded now, so the strings can go
+        self.__df = None
+
+    def _emit_stage(self, stage: str, start: float, source: str) -> float:
+        """Sends a `StageEvent` to the observer, if any. Returns the current time for timing the next stage."""
+        now = time.perf_counter()
+        if self.observer is not None:
+            self.observer.on_stage(StageEvent(stage, now - start, source, len(self.submission_ids)))
+        return now
 
-    def _get_dataframe(self) -> pd.DataFrame:
-        df = pd.read_csv(self.csv_filepath, header=[1], dtype=str)
+    @staticmethod
+    def _source_name(csv_filepath: Union[str, IO]) -> str:
+        """Filepath, or the name of an open file object ("upload" if it has none)"""
+        if isinstance(csv_filepath, str):
+            return csv_filepath
+        return str(getattr(csv_filepath, "name", "upload"))
+
+    @staticmethod
+    def _read_export(csv_filepath: Union[str, IO]) -> pd.DataFrame:
+        df = pd.read_csv(csv_filepath, header=[1], dtype=str)
         df[SUBMISSION_ID_COLNAME] = df[SUBMISSION_ID_COLNAME].astype(int)
         df = df.set_index(SUBMISSION_ID_COLNAME)
         return df
 
+    @wc_update_catcher
+    def _read_exports(self, max_workers: Optional[int] = None) -> list[pd.DataFrame]:
+        """
+        Helper function for __init__
+
+        Reads every export, on `max_workers` threads if there are several, and checks they have the same questions.
+        See `__init__` for parameters.
+        """
+        if len(self.csv_filepaths) == 1:
+            return [self._read_export(self.csv_filepaths[0])]
+
+        workers = max_workers or min(len(self.csv_filepaths), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            frames = list(executor.map(self._read_export, self.csv_filepaths))
+
+        columns = set(frames[0].columns)
+        for filepath, frame in zip(self.csv_filepaths[1:], frames[1:]):
+            if set(frame.columns) != columns:
+                raise ValueError(
+                    f"""
+                    {filepath} has different questions than {self.csv_filepaths[0]}
+                    Only in {filepath}: {sorted(set(frame.columns) - columns)}
+                    Only in {self.csv_filepaths[0]}: {sorted(columns - set(frame.columns))}
+                    """
+                )
+        return frames
+
+    @staticmethod
+    def _merge_exports(frames: list[pd.DataFrame], duplicate_policy: str = "error") -> pd.DataFrame:
+        """
+        Helper function for __init__
+
+        Merges the exports read by `_read_exports`, applying `duplicate_policy` to shared SubmissionIds.
+        Collisions are the caller's to resolve, so they are raised as they are, not as a `ParsingException`.
+        """
+        if len(frames) == 1:
+            return frames[0]
+        df = pd.concat(frames)
+
+        duplicated = df.index.duplicated(keep=False)
+        if duplicated.any():
+            if duplicate_policy == "error":
+                collisions = sorted(set(df.index[duplicated]))
+                raise ValueError(f"SubmissionId collisions between exports: {collisions[:10]}"
+                                 f"{' ...' if len(collisions) > 10 else ''}. Choose a duplicate_policy.")
+            elif duplicate_policy == "drop":
+                df = df[~duplicated]
+            else:
+                df = df[~df.index.duplicated(keep=duplicate_policy)]
+        return df
+
     @staticmethod
     def _valid_rank_set(rank_set: set[int]) -> bool:
         """
@@ -87,62 +243,171 @@ class WildcatConnectionCSV:
                 )
         return {question: len(rank_set) for question, rank_set in tracked.items()}
 
-    def _get_one_ballot_format(self, question: str, num_candidates: int) -> tuple[RankedChoiceBallots, list[str]]:
+    def _get_answer_codes(self) -> tuple[np.ndarray, np.ndarray]:
         """
-        Helper function to `_get_ballot_formatted_strings`
+        Helper function for __init__
+
+        Codes every answer of every question at once, against one sorted list of every name in the export.
+
+        `self.__df` and `self.question_num_candidates` should already be populated.
+
+        Returns
+        -------
+        codes : np.ndarray[int]
+            Questions x submissions x ranks codes into `names`, -1 for empty ranks and ranks past
+            a question's number of candidates
+        names : np.ndarray[object]
+            Sorted names of every answer in the export
+        """
+        values = self.__df.to_numpy()
+        column_index = {column: i for i, column in enumerate(self.__df.columns)}
+        max_ranks = max(self.question_num_candidates.values(), default=0)
+        # the padding column, last, stands in for ranks past a question's number of candidates
+        columns = np.full((len(self.question_num_candidates), max(max_ranks, 1)), values.shape[1])
+        for q, (question, num_ranks) in enumerate(self.question_num_candidates.items()):
+            columns[q, :num_ranks] = [column_index[f"{question}{QUESTION_RANK_SEPARATOR}{rank}"]
+                                      for rank in range(1, num_ranks + 1)]
+
+        codes, names = pd.factorize(values.ravel(), sort=True)
+        codes = codes.reshape(values.shape).astype(code_dtype(len(names)))
+        del values
+        padded = np.concatenate([codes, np.full((len(codes), 1), -1, dtype=codes.dtype)], axis=1)
+        return padded[:, columns].transpose(1, 0, 2), np.asarray(names, dtype=object)
+
+    def _classify_ballots(self,
+                          codes: np.ndarray,
+                          names: np.ndarray,
+                          valid_candidates: dict[str, list[str]]) -> tuple[dict[str, np.ndarray], np.ndarray]:
+        """
+        Helper function for __init__
+
+        Finds gaps, duplicate candidates and unknown candidates on every ballot of every question at once.
 
         Parameters
         ----------
-        question : str
-            Question name
-        num_candidates : int
-            Number of candidates
+        codes, names :
+            See `_get_answer_codes`
+        valid_candidates : dict[str, list[str]]
+            See `__init__`
+
         Returns
         -------
-        ballot_list : RankedChoiceBallots
-            Ballot object
-        spoiled_ballots : list[str]
-            List of Submission IDs of spoiled ballots
-        """
-        def _is_spoiled(row: list[str]) -> bool:
-            for i in range(1, len(row)):
-                if isnan(row[i-1]) and not isnan(row[i]):
-                    return True
-            return False
-
-        columns = [f"{question}{QUESTION_RANK_SEPARATOR}{rank}"
-                   for rank in range(1, num_candidates + 1)]
-        valid_rows = []
-        spoiled_ballots = []
-        for submission_id, row in self.__df[columns].iterrows():
-            row = row.tolist()
-            if _is_spoiled(row):
-                spoiled_ballots.append(submission_id)
-            else:
-                valid_rows.append([item for item in row if not isnan(item)])
-        # RankedChoiceBallots
-        ballots = RankedChoiceBallots(valid_rows)
-        return ballots, spoiled_ballots
+        spoil_category_masks : dict[str, np.ndarray[bool]]
+            See `spoil_category_masks` attribute
+        drop : np.ndarray[bool]
+            Questions x submissions x ranks mask of answers to ignore: repeats of a candidate already ranked
+            higher on the same ballot, and unknown candidates
+        """
+        present = codes != -1
+        gap = (~present[..., :-1] & present[..., 1:]).any(axis=-1)
+
+        # a stable sort keeps a repeated candidate's highest rank first, so the later ones are the repeats
+        order = np.argsort(codes, axis=-1, kind="stable")
+        ranked = np.take_along_axis(codes, order, axis=-1)
+        repeats = np.zeros_like(present)
+        np.put_along_axis(repeats, order[..., 1:], (ranked[..., 1:] == ranked[..., :-1]) & (ranked[..., 1:] != -1),
+                          axis=-1)
+
+        known = np.ones((len(codes), len(names) + 1), dtype=bool)
+        for q, question in enumerate(self.question_num_candidates):
+            if question in valid_candidates:
+                known[q, :-1] = np.isin(names, list(valid_candidates[question]))
+        unknown = ~known[np.arange(len(codes))[:, None, None], codes]
+
+        masks = {"gap": gap, "duplicate": repeats.any(axis=-1), "unknown": unknown.any(axis=-1)}
+        return masks, repeats | unknown
+
+    def _apply_spoil_policy(self, codes: np.ndarray, drop: np.ndarray, spoil_policy: str) -> np.ndarray:
+        """
+        Helper function for __init__
+
+        Applies `spoil_policy` to every question at once, editing `codes` in place.
+        See `__init__` for the policies.
+
+        Returns
+        -------
+        spoiled_mask : np.ndarray[bool]
+            See `spoiled_mask` attribute
+        """
+        if spoil_policy == "discard":
+            spoiled_mask = np.logical_or.reduce(list(self.spoil_category_masks.values()))
+            codes[spoiled_mask] = EXHAUSTED
+            return spoiled_mask
+
+        keep = (codes != -1) & ~drop
+        if spoil_policy == "truncate":
+            keep = np.logical_and.accumulate(keep, axis=-1)
+        codes[~keep] = EXHAUSTED
+        # move the kept rankings up, in order
+        codes[...] = np.take_along_axis(codes, np.argsort(~keep, axis=-1, kind="stable"), axis=-1)
+        return np.zeros(codes.shape[:2], dtype=bool)
+
+    def _get_ballot_tensor(self, codes: np.ndarray, names: np.ndarray) -> tuple[np.ndarray, dict[str, list[str]]]:
+        """
+        Helper function for __init__
+
+        Recodes every question's answers to its own sorted candidates, in one pass over a single allocation.
+        Only candidates on counted ballots are kept, so those that only appear on spoilt ballots are dropped.
+
+        Parameters
+        ----------
+        codes, names :
+            See `_get_answer_codes`, after `_apply_spoil_policy`
+
+        Returns
+        -------
+        ballot_tensor : np.ndarray[int]
+            See `ballot_tensor` attribute
+        question_candidates : dict[str, list[str]]
+            See `question_candidates` attribute
+        """
+        num_questions = len(codes)
+        used = np.zeros((num_questions, len(names) + 1), dtype=bool)
+        used[np.arange(num_questions)[:, None, None], codes] = True
+        used[:, -1] = False
+        recode = np.where(used, np.cumsum(used, axis=1) - 1, EXHAUSTED)
+        num_candidates = int(used.sum(axis=1).max(initial=0))
+        tensor = recode[np.arange(num_questions)[:, None, None], codes].astype(code_dtype(num_candidates))
+        # read-only, so the question stores can view it without copying, see `EncodedBallots.cache`
+        tensor.flags.writeable = False
+        question_candidates = {
+            question: [str(name) for name in names[used[q, :-1]]]
+            for q, question in enumerate(self.question_num_candidates)
+        }
+        return tensor, question_candidates
 
     def _get_ballot_formatted_strings(self) -> tuple[dict[str, RankedChoiceBallots], dict[str, list[str]]]:
         """
-        For each question, get the ballot formatted string and the submission ids of spoilt ballots.
+        For each question, get the ballots and the submission ids of spoilt ballots.
 
-        `self.__df` and `self.question_num_candidates` should already be populated.
+        Ballots are zero-copy views into `self.ballot_tensor`, with spoilt ballots given weight 0.
+
+        `self.ballot_tensor` and `self.question_candidates` should already be populated.
 
         Returns
         -------
-        question_formatted_ballots : dict[str, str]
-            Contains the formatted ballot string for each question.
+        question_formatted_ballots : dict[str, RankedChoiceBallots]
+            Contains the ballots for each question.
         question_spoilt_ballots : dict[str, list[str]]
             Contains the Submission IDs of the spoilt ballots for each question.
 
         """
         question_formatted_ballots, question_spoilt_ballots = {}, {}
-        for question, num_candidates in self.question_num_candidates.items():
-            ballot_string, spoiled_ballots = self._get_one_ballot_format(question, num_candidates)
-            question_formatted_ballots[question] = ballot_string
-            question_spoilt_ballots[question] = spoiled_ballots
+        for q, (question, num_candidates) in enumerate(self.question_num_candidates.items()):
+            start = time.perf_counter()
+            valid = ~self.spoiled_mask[q]
+            weights = valid.astype(np.int64)
+            weights.flags.writeable = False
+            encoded = EncodedBallots(
+                self.question_candidates[question],
+                self.ballot_tensor[q, :, :max(num_candidates, 1)],
+                weights,
+                np.flatnonzero(valid),
+                ids=self.submission_ids
+            )
+            question_formatted_ballots[question] = RankedChoiceBallots(encoded=encoded)
+            question_spoilt_ballots[question] = self.submission_ids[self.spoiled_mask[q]].tolist()
+            self._emit_stage("ballots", start, question)
 
         return question_formatted_ballots, question_spoilt_ballots
 
@@ -154,7 +419,9 @@ class WildcatConnectionCSV:
         -------
         ballot_folder : str
         """
-        csv_basename = os.path.basename(self.csv_filepath).split('.')[0]
+        csv_basename = os.path.basename(self._source_name(self.csv_filepaths[0])).split('.')[0]
+        if len(self.csv_filepaths) > 1:
+            csv_basename += "-merged"
         timestamp_str = str(datetime.datetime.now())
         return os.path.join(BALLOT_FOLDER, f"{csv_basename}-{timestamp_str}")
 
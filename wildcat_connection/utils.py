@@ -1,4 +1,5 @@
-from typing import Any, Callable
+import os
+from typing import Any, Callable, IO, Union
 import numpy as np
 
 
@@ -9,6 +10,28 @@ def isnan(item: Any) -> bool:
     return np.isnan(item)
 
 
+def expand_export_paths(csv_filepath: Union[str, IO, list[Union[str, IO]]]) -> list[Union[str, IO]]:
+    """
+    Expands the exports given to `WildcatConnectionCSV` into a list of CSV files.
+
+    `csv_filepath` may be a CSV file, a directory (every `.csv` file directly inside it, sorted),
+    several of these separated by `os.pathsep`, an open file object, or a list of any of these.
+    """
+    if isinstance(csv_filepath, str):
+        csv_filepath = [path for path in csv_filepath.split(os.pathsep) if path]
+    elif hasattr(csv_filepath, "read"):
+        csv_filepath = [csv_filepath]
+    filepaths = []
+    for path in csv_filepath:
+        if not hasattr(path, "read") and os.path.isdir(path):
+            filepaths += sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(".csv"))
+        else:
+            filepaths.append(path)
+    if not filepaths:
+        raise ValueError(f"No CSV exports found in {csv_filepath}")
+    return filepaths
+
+
 def wc_update_catcher(func: Callable) -> Callable:
     def decorator(*args, **kwargs) -> Any:
         try: